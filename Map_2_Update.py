@@ -5,6 +5,8 @@ import pydeck as pdk
 import requests
 import math
 
+from waterwatch import assets
+
 # ✅ Set OpenAI API Key
 openai.api_key = ""  # <-- Your real OpenAI key here
 
@@ -53,9 +55,6 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# ✅ Image
-water_image = "https://images.unsplash.com/photo-1589927986089-35812388d1b4"
-
 # Multilingual Setup
 msgs = {
     "nav_title": {"English": "Navigation", "Español": "Navegación"},
@@ -182,7 +181,9 @@ if page == msgs["map"][language]:
 elif page == msgs["help_center"][language]:
     st.header(msgs["help_center"][language])
 
-    st.image(water_image, width=600, caption="Clean Water for Everyone 💧")
+    water_image = assets.hero_image()
+    if water_image:
+        st.image(water_image, width=assets.HERO_WIDTH, caption="Clean Water for Everyone 💧")
 
     if "current_page" not in st.session_state:
         st.session_state["current_page"] = ""
@@ -0,0 +1,325 @@
+"""Concurrent multi-session load test for main.py and the pages.
+
+Starts one real `streamlit run`-style server (with the upstream services
+replaced by the stand-ins in benchmarks/standins.py) and drives N sessions
+against it at once over Streamlit's websocket, the way N browsers would. Every
+session gives consent on the home page, submits a water report and filters
+the gallery, moves the map slider, and filters the community bulletin.
+Because all sessions share the one server process, they contend for the same
+`st.cache_*` entries, sheet replica lock, API gateway and GIL.
+
+Before timing, each level walks one warm-up journey so cold imports and first
+cache fills aren't counted. The report shows rerun latency percentiles,
+reruns per second, the server's RSS after warm-up and its peak RSS:
+
+    python benchmarks/load_test.py --sessions 1 10 25 50 --latency openai=2 overpass=0.5
+
+Needs the `websockets` package. Fragment timers (`run_every`) are driven by
+the browser, so their reruns are not simulated here.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+RUN_TIMEOUT = 120
+STARTUP_TIMEOUT = 60
+# Seed rows are dated 2023; keep the background archiver from moving them out mid-run.
+SEED_HOT_DAYS = "100000"
+
+# URL path of each page under pages/, as the server's navigation message names them.
+PAGES = {"reporting": "Reporting", "map": "Water_Map_&_Tips", "bulletin": "Community_Bulletin"}
+
+
+def seed_worksheets(rows, alerts):
+    from session_memory import make_table
+    from waterwatch.alerts import RESOURCE_TYPES
+
+    kinds = list(RESOURCE_TYPES)
+    now = datetime.now()
+    reports = make_table(rows)
+    bulletin = pd.DataFrame({
+        "timestamp": [(now - timedelta(minutes=10 * n)).strftime("%Y-%m-%d %H:%M") for n in range(alerts)],
+        "type": [kinds[n % len(kinds)] for n in range(alerts)],
+        "message": ["Fresh water and snacks available today."] * alerts,
+        "location_name": [f"Community Center {n}" for n in range(alerts)],
+        "address": [f"{100 + n} Main St, San Jose, CA 95112" for n in range(alerts)],
+        "coordinates": [""] * alerts,
+        "hours": ["9am-5pm"] * alerts,
+        "expiration_time": [(now + timedelta(hours=6)).strftime("%Y-%m-%d %H:%M")] * alerts,
+    })
+    return {"Water-Report": reports, "alerts": bulletin}
+
+
+def serve(port, args, data_dir):
+    """Run the app server in this (spawned) process with the stand-ins installed."""
+    os.chdir(ROOT)
+    os.environ["WATERWATCH_DATA_DIR"] = data_dir
+    os.environ["WATERWATCH_HOT_DAYS"] = SEED_HOT_DAYS
+    os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+    os.environ.setdefault("OPENCAGE_API_KEY", "stand-in")
+    os.environ.pop("WATERWATCH_PROFILE", None)
+
+    import standins
+    from streamlit.web import bootstrap
+
+    standins.install(args.latency, seed_worksheets(args.rows, args.alerts))
+    flags = {
+        "server_port": port,
+        "server_headless": True,
+        "server_fileWatcherType": "none",
+        "server_runOnSave": False,
+        "browser_gatherUsageStats": False,
+        "logger_level": "warning",
+    }
+    bootstrap.load_config_options(flag_options=flags)
+    bootstrap.run(str(ROOT / "main.py"), False, [], flags)
+
+
+def rss_mb(pid, field="VmRSS"):
+    """Current (VmRSS) or peak (VmHWM) resident memory of a process, from /proc."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class Session:
+    """One simulated browser tab, recording how long each rerun took."""
+
+    def __init__(self, number, port, timings, errors):
+        self.rng = random.Random(number)
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.timings = timings
+        self.errors = errors
+        self.pages = {}
+        self.page_hash = ""
+        self.widgets = {}
+        self.values = {}
+
+    async def run(self, step, page=None, **changes):
+        """Rerun the script (switching page if given) with `changes` applied and wait for it to finish.
+
+        `changes` maps widget label to a new value; True clicks a button.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        if page is not None:
+            self.page_hash = self.pages[PAGES[page]]
+            self.values = {}
+        message = BackMsg()
+        message.rerun_script.page_script_hash = self.page_hash
+        triggers, changed = [], set()
+        for label, value in changes.items():
+            kind, widget_id = self.widgets[label][:2]
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            if kind in ("button", "form_submit_button"):
+                state.trigger_value = True
+                triggers.append(widget_id)
+            elif kind == "multiselect":
+                state.string_array_value.data.extend(value)
+            elif kind == "slider":
+                state.double_array_value.data.extend([value])
+            else:
+                state.string_value = value
+            self.values[widget_id] = state
+            changed.add(widget_id)
+        # Like the browser, send every widget value set so far on this page, not just the changes.
+        for widget_id, state in self.values.items():
+            if widget_id not in triggers and widget_id not in changed:
+                message.rerun_script.widget_states.widgets.add().CopyFrom(state)
+        for widget_id in triggers:
+            del self.values[widget_id]
+
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        await asyncio.wait_for(self._until_finished(step), RUN_TIMEOUT)
+        self.timings.append((step, time.perf_counter() - started))
+
+    async def _until_finished(self, step):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.widgets = {}
+        while True:
+            message = ForwardMsg()
+            message.ParseFromString(await self.ws.recv())
+            kind = message.WhichOneof("type")
+            if kind == "navigation":
+                self.pages = {page.url_pathname: page.page_script_hash for page in message.navigation.app_pages}
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                element = message.delta.new_element
+                element_type = element.WhichOneof("type")
+                widget = getattr(element, element_type)
+                if element_type == "exception":
+                    self.errors.append((step, widget.message))
+                elif getattr(widget, "id", ""):
+                    self.widgets[widget.label] = (element_type, widget.id, list(getattr(widget, "options", [])))
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append((step, "script failed to compile"))
+                if message.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+    def options(self, label):
+        return self.widgets[label][2]
+
+    def label_where(self, kind, test=lambda options: True):
+        return next(label for label, (element_type, _, options) in self.widgets.items()
+                    if element_type == kind and test(options))
+
+    async def journey(self):
+        async with websockets.connect(self.url, max_size=None) as self.ws:
+            await self.run("home")
+            await self.run("consent", **{"Do you agree to the data collection policy?": "I consent", "Continue": True})
+
+            await self.run("reporting", page="reporting")
+            await self.run(
+                "submit_report",
+                **{
+                    "Address or general location": f"{self.rng.randint(1, 9999)} Riverside Blvd",
+                    "Zip Code": f"95{self.rng.randint(100, 159):03d}",
+                    self.label_where("text_area"): "Brown water with a strong smell",
+                    "Select any observed issues:": ["Foul smell"],
+                    "Submit Report": True,
+                },
+            )
+            gallery_zip = "Filter by ZIP Code (optional):"
+            await self.run("gallery_filter", **{gallery_zip: self.rng.choice(self.options(gallery_zip)[1:])})
+
+            await self.run("map", page="map")
+            slider = next((label for label, (kind, *_) in self.widgets.items() if kind == "slider"), None)
+            if slider is not None:
+                await self.run("map_slider", **{slider: self.rng.choice([1.0, 2.5, 5.0, 7.5])})
+
+            await self.run("bulletin", page="bulletin")
+            type_filter = self.label_where("selectbox", lambda options: "All" in options)
+            await self.run("bulletin_filter", **{type_filter: self.options(type_filter)[1]})
+
+
+async def walk(number, port, timings, errors):
+    try:
+        await Session(number, port, timings, errors).journey()
+    except Exception as e:
+        errors.append(("journey", repr(e)))
+
+
+async def wait_for_server(port, server):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if not server.is_alive():
+            raise RuntimeError("the app server exited during startup")
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream"):
+                return
+        except OSError:
+            await asyncio.sleep(0.25)
+    raise TimeoutError(f"the app server did not start within {STARTUP_TIMEOUT}s")
+
+
+async def drive(sessions, port, server):
+    """Warm the server up with one journey, then walk `sessions` journeys at once."""
+    await wait_for_server(port, server)
+    await walk(-1, port, [], [])
+    warm_rss = rss_mb(server.pid)
+
+    timings, errors = [], []
+    started = time.time()
+    await asyncio.gather(*(walk(number, port, timings, errors) for number in range(sessions)))
+    return timings, errors, time.time() - started, warm_rss
+
+
+def run_level(sessions, args):
+    """Start a fresh server, run `sessions` concurrent journeys against it and summarize them."""
+    port = free_port()
+    data_dir = tempfile.mkdtemp(prefix="waterwatch-load-")
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(port, args, data_dir), daemon=True)
+    server.start()
+    try:
+        timings, errors, elapsed, warm_rss = asyncio.run(drive(sessions, port, server))
+        peak_rss = rss_mb(server.pid, "VmHWM")
+    finally:
+        server.terminate()
+        server.join(10)
+
+    latencies = np.array([seconds for _, seconds in timings]) * 1000
+    by_step = pd.DataFrame(timings, columns=["step", "seconds"]).groupby("step")["seconds"].quantile(0.95) * 1000
+    return {
+        "sessions": sessions,
+        "reruns": len(timings),
+        "errors": len(errors),
+        "p50_ms": np.percentile(latencies, 50) if len(latencies) else np.nan,
+        "p95_ms": np.percentile(latencies, 95) if len(latencies) else np.nan,
+        "p99_ms": np.percentile(latencies, 99) if len(latencies) else np.nan,
+        "max_ms": latencies.max() if len(latencies) else np.nan,
+        "reruns_per_s": len(timings) / elapsed,
+        "warm_rss_mb": warm_rss,
+        "peak_rss_mb": peak_rss,
+        "step_p95_ms": by_step.round(0).to_dict(),
+        "first_errors": errors[:3],
+    }
+
+
+def parse_latency(items):
+    overrides = {}
+    for item in items:
+        service, _, seconds = item.partition("=")
+        overrides[service] = float(seconds)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25])
+    parser.add_argument("--rows", type=int, default=5000, help="reports in the stand-in worksheet")
+    parser.add_argument("--alerts", type=int, default=30, help="active bulletin alerts")
+    parser.add_argument("--latency", nargs="*", default=[], metavar="SERVICE=SECONDS",
+                        help="stand-in latency for sheets, overpass, opencage or openai")
+    parser.add_argument("--by-step", action="store_true", help="also print p95 latency per step")
+    args = parser.parse_args()
+    args.latency = parse_latency(args.latency)
+    if websockets is None:
+        parser.error("the load test needs the websockets package (pip install websockets)")
+
+    results = []
+    for sessions in args.sessions:
+        result = run_level(sessions, args)
+        results.append(result)
+        for step, message in result["first_errors"]:
+            print(f"[{sessions} sessions] {step}: {message}", file=sys.stderr)
+
+    table = pd.DataFrame(results).drop(columns=["step_p95_ms", "first_errors"])
+    print(table.round(1).to_string(index=False))
+    if args.by_step:
+        print()
+        print(pd.DataFrame({r["sessions"]: r["step_p95_ms"] for r in results}).to_string())
+
+
+if __name__ == "__main__":
+    main()
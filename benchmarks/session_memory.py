@@ -0,0 +1,92 @@
+"""Per-session memory overhead: private DataFrame copies vs. shared snapshots.
+
+Simulates N concurrent Streamlit sessions rendering the Report Gallery
+against the same table, and reports traced memory held per session. Both
+sides do the same page work (filter to one ZIP code, parse and sort its
+timestamps, render every row left); they differ only in how the session gets
+its DataFrame and its rows.
+
+    python benchmarks/session_memory.py --sessions 200 --rows 20000
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from waterwatch.sheets import Snapshot, iter_records  # noqa: E402  (also enables Copy-on-Write)
+
+
+def make_table(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    concerns = np.array(["Discoloration", "Foul smell", "Foam on surface", "Trash nearby", "Other"])
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2023-01-01", periods=rows, freq="37min").strftime("%Y-%m-%d %H:%M"),
+        "address": [f"{n} Riverside Blvd, San Jose, CA" for n in rng.integers(1, 9999, rows)],
+        "zipcode": rng.choice([f"95{n:03d}" for n in range(100, 160)], rows),
+        "description": rng.choice(["Brown water with a strong smell", "Clear but tastes of metal",
+                                   "Foam along the edge, not flowing", "Looks fine"], rows),
+        "concerns": rng.choice(concerns, rows),
+        "type": rng.choice(["Faucet", "River/Stream", "Fountain"], rows),
+        "used": rng.choice(["Yes", "No"], rows),
+        "symptoms": rng.choice(["N/A", "Stomach ache", "Rash"], rows),
+    }).astype(str)
+
+
+def session_before(table, zipcode):
+    # Each session parsed its own copy of the sheet and built a list of dicts.
+    data = table.copy(deep=True)
+    data["zipcode"] = data["zipcode"].astype(str).str.strip()
+    data["timestamp"] = pd.to_datetime(data["timestamp"], errors="coerce")
+    shown = data[data["zipcode"] == zipcode].sort_values("timestamp", ascending=False)
+    records = shown.to_dict(orient="records")
+    for _ in records:
+        pass
+    return data, shown, records
+
+
+def session_after(snapshot, zipcode):
+    # Sessions share the snapshot and stream the rows they render.
+    data = snapshot.view()
+    shown = data[data["zipcode"] == zipcode]
+    shown = shown.assign(timestamp=pd.to_datetime(shown["timestamp"], errors="coerce"))
+    shown = shown.sort_values("timestamp", ascending=False)
+    for _ in iter_records(shown):
+        pass
+    return data, shown
+
+
+def measure(label, make_session, sessions):
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    held = [make_session() for _ in range(sessions)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_session = (current - baseline) / sessions
+    print(f"{label:<8} {sessions:>5} sessions  {per_session / 1024:>10.1f} KiB/session  "
+          f"peak {(peak - baseline) / 2**20:>8.1f} MiB")
+    del held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    table = make_table(args.rows)
+    snapshot = Snapshot(version=1, data=table, synced_at=0.0)
+    zipcodes = sorted(table["zipcode"].unique())
+    print(f"table: {args.rows} rows, {table.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+    # Both sides see the same sequence of ZIP filters.
+    before_zips, after_zips = iter(np.resize(zipcodes, args.sessions)), iter(np.resize(zipcodes, args.sessions))
+    measure("before", lambda: session_before(table, next(before_zips)), args.sessions)
+    measure("after", lambda: session_after(snapshot, next(after_zips)), args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Local stand-ins for Google Sheets, Overpass, OpenCage and OpenAI.
+
+`install(latency)` swaps them in for the real services inside the current
+process, so the pages can be driven without network access or API keys.
+Each stand-in sleeps for its configured latency (seconds, +/- 25% jitter)
+before answering, to mimic the upstream's response time.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter
+from streamlit.connections import BaseConnection
+
+DEFAULT_LATENCY = {"sheets": 0.3, "overpass": 0.8, "opencage": 0.2, "openai": 1.2}
+BBOX = (37.20, -122.00, 37.45, -121.70)
+
+latency = dict(DEFAULT_LATENCY)
+
+
+def _wait(service):
+    delay = latency.get(service, 0.0)
+    if delay > 0:
+        time.sleep(random.uniform(0.75 * delay, 1.25 * delay))
+
+
+class FakeWorksheet:
+    """The ranged `get` of a gspread worksheet, over one in-memory worksheet."""
+
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+        self.id = name
+        self.spreadsheet = self
+
+    def get(self, range_name, **kwargs):
+        _wait("sheets")
+        first_row = int(range_name.split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+        with self.connection._lock:
+            data = self.connection.worksheets.get(self.name, pd.DataFrame())
+        rows = data.iloc[max(0, first_row - 2):]
+        return [["" if pd.isna(value) else value for value in row] for row in rows.itertuples(index=False, name=None)]
+
+    def batch_update(self, body):
+        _wait("sheets")
+        with self.connection._lock:
+            data = self.connection.worksheets[self.name]
+            for request in body["requests"]:
+                span = request["deleteDimension"]["range"]
+                data = data.drop(data.index[span["startIndex"] - 1:span["endIndex"] - 1]).reset_index(drop=True)
+            self.connection.worksheets[self.name] = data
+
+
+class FakeSheetsConnection(BaseConnection):
+    """In-memory worksheets shared by every session in the process."""
+
+    worksheets = {}
+    _lock = threading.Lock()
+
+    def _connect(self, **kwargs):
+        return self.worksheets
+
+    @property
+    def client(self):
+        # Stands in for the service-account client that SheetReplica reads ranges through.
+        return SimpleNamespace(_select_worksheet=lambda worksheet: FakeWorksheet(self, worksheet))
+
+    def read(self, worksheet=None, ttl=None, dtype=None, **kwargs):
+        _wait("sheets")
+        with self._lock:
+            data = self.worksheets.get(worksheet, pd.DataFrame())
+        return data.astype(dtype).mask(data.isna()) if dtype is not None else data.copy()
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        _wait("sheets")
+        with self._lock:
+            self.worksheets[worksheet] = data.reset_index(drop=True).copy()
+        return data
+
+
+class UpstreamAdapter(BaseAdapter):
+    """Answers Overpass and OpenCage requests made through the shared HTTP session."""
+
+    def __init__(self, water_sources=300, seed=0):
+        super().__init__()
+        rng = random.Random(seed)
+        self.elements = [
+            {"type": "node", "id": n, "lat": rng.uniform(BBOX[0], BBOX[2]), "lon": rng.uniform(BBOX[1], BBOX[3]),
+             "tags": {"amenity": "drinking_water"}}
+            for n in range(water_sources)
+        ]
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        if "overpass" in url.netloc:
+            _wait("overpass")
+            body = {"elements": self.elements}
+        elif "opencage" in url.netloc:
+            _wait("opencage")
+            query = parse_qs(url.query).get("q", [""])[0]
+            digest = int(hashlib.sha256(query.encode()).hexdigest()[:8], 16)
+            body = {"results": [{"geometry": {
+                "lat": BBOX[0] + (digest % 1000) / 1000 * (BBOX[2] - BBOX[0]),
+                "lng": BBOX[1] + (digest // 1000 % 1000) / 1000 * (BBOX[3] - BBOX[1]),
+            }}]}
+        else:
+            body = {}
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeOpenAI:
+    """Just enough of the OpenAI client for `waterwatch.llm.chat`."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, **params):
+        _wait("openai")
+        prompt = " ".join(message["content"] for message in messages)
+        text = "Stand-in reply: the water here should be boiled before use. " * 3
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4),
+        )
+
+
+def install(overrides=None, worksheets=None):
+    """Route every upstream call in this process to the stand-ins."""
+    latency.update(overrides or {})
+    FakeSheetsConnection.worksheets.update(worksheets or {})
+
+    # Pages import GSheetsConnection from here on every rerun.
+    import streamlit_gsheets
+    streamlit_gsheets.GSheetsConnection = FakeSheetsConnection
+
+    from waterwatch import httpclient, llm, sheets
+    sheets.GSheetsConnection = FakeSheetsConnection
+    adapter = UpstreamAdapter()
+    httpclient._session.mount("https://", adapter)
+    httpclient._session.mount("http://", adapter)
+    llm._client = FakeOpenAI()
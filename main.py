@@ -1,6 +1,8 @@
 import streamlit as st
 
-LOGO_URL = "https://raw.githubusercontent.com/blam1921/FULL-PROTOTYPE/refs/heads/main/waterwatchlogov2.png"
+from waterwatch import assets, lite, profiling
+
+profiling.maybe_profile(__file__)
 
 # Set page config
 st.set_page_config(page_title="WaterWatch Community", layout="wide")
@@ -11,8 +13,9 @@ background_color = st.get_option('theme.backgroundColor')
 text_color = st.get_option('theme.textColor')
 secondary_background_color = st.get_option('theme.secondaryBackgroundColor')
 
-# 🔹 Global CSS Styling (using Streamlit's theme settings)
-st.markdown(f"""
+# 🔹 Global CSS Styling (using Streamlit's theme settings), skipped in lite mode
+if not lite.enabled():
+    st.markdown(f"""
 <style>
     html, body, [class*="css"] {{
         font-family: 'Segoe UI', sans-serif;
@@ -44,11 +47,22 @@ if "analytics_consent" not in st.session_state:
     st.session_state.analytics_consent = None
 if "language" not in st.session_state:
     st.session_state.language = "English"
+if "lite_mode" not in st.session_state:
+    st.session_state.lite_mode = False
 
 # 🌎 Language Switcher
 with st.sidebar:
-    st.image(LOGO_URL, width=300)
+    if not lite.enabled():
+        st.image(assets.logo(assets.SIDEBAR_WIDTH), width=assets.SIDEBAR_WIDTH)
     st.session_state.language = st.selectbox("🌎 Language / Idioma", ["English", "Español"])
+    # 📶 Lite mode: the callback stores the choice before the next run starts, so the whole run honours it
+    st.toggle(
+        "📶 Lite mode / Modo ligero",
+        value=st.session_state.lite_mode,
+        key="lite_toggle",
+        on_change=lambda: st.session_state.update(lite_mode=st.session_state.lite_toggle),
+        help="Text only: no images, maps or styling. / Solo texto: sin imágenes, mapas ni estilos.",
+    )
 
 language = st.session_state.language
 
@@ -142,7 +156,6 @@ if not st.session_state.consent_given:
 else:
     st.title(texts["main_title"][language])
     st.markdown(texts["main_intro"][language])
-    st.markdown(
-        f'<div style="text-align: center;"><img src="{LOGO_URL}" width="500"></div>',
-        unsafe_allow_html=True
-    )
+    if not lite.enabled():
+        _, logo_col, _ = st.columns([1, 2, 1])
+        logo_col.image(assets.logo(assets.BANNER_WIDTH), width=assets.BANNER_WIDTH)
@@ -3,43 +3,117 @@ import pandas as pd
 from datetime import datetime
 import os
 from streamlit_gsheets import GSheetsConnection
-import matplotlib.pyplot as plt
-import re
+import pydeck as pdk
+from itertools import islice
+
+from waterwatch import archive, assets, jobs, lite, profiling, tasks
+from waterwatch.analytics import emerging_issues
+from waterwatch.geo import geocode
+from waterwatch.heatmap import build_layer, centroids_version, fill_centroids
+from waterwatch.ingest import validate_file
+from waterwatch.jobs import QueueFull, get_jobs
+from waterwatch.photos import PHOTO_TYPES, InvalidPhoto, has_photo, photo_path, store_photo, thumbnail_path
+from waterwatch.reports import CONCERN_OPTIONS, SOURCE_TYPES, USED_OPTIONS, validate_zipcode
+from waterwatch.search import DataFrameIndex
+from waterwatch.summarize import summarize_reports
+from waterwatch.usage import ledger
+from waterwatch.sheets import get_replica, iter_records
+
+profiling.maybe_profile(__file__)
 
 # 🔒 Check global consent at page load
 if "consent_given" not in st.session_state or not st.session_state.consent_given:
     st.error("❌ Consent is required to use this app. Please return to the homepage.")
     st.stop()
 
-LOGO_URL = "https://raw.githubusercontent.com/blam1921/FULL-PROTOTYPE/refs/heads/main/waterwatchlogov2.png"
-
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+OPENCAGE_API_KEY = os.environ.get("OPENCAGE_API_KEY")
 
 # Fetch existing reports data
+# Zero-copy view of the process-wide snapshot (zipcodes are already normalised there)
 def load_data():
-    data = conn.read(worksheet=SHEET_NAME, ttl=5)
-    data = data.dropna(how="all")
-
-    # Convert zipcodes to string early to prevent formatting issues
-    if "zipcode" in data.columns:
-        data["zipcode"] = data["zipcode"].astype(str).str.strip()
-
-    return data
+    return get_replica(SHEET_NAME).snapshot().view()
+
+# Archived months only change when the archive job runs, so cache reads per manifest version
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=32)
+def load_archive(archive_version, start=None, zipcodes=None):
+    return archive.read_archive(start=start, zipcodes=zipcodes)
+
+# Live rows plus archived ones, limited to reports since `start` and the given ZIP codes
+def load_history(archive_version, start=None, zipcodes=None):
+    hot = archive.live_only(load_data())
+    if start:
+        hot = hot[hot['timestamp'] >= start]
+    if zipcodes is not None:
+        hot = hot[hot['zipcode'].isin(zipcodes)]
+    return pd.concat([load_archive(archive_version, start, zipcodes), hot], ignore_index=True)
+
+# Spike scores only change when the data does, so cache them per replica and archive version
+@st.cache_data(show_spinner=False, ttl=3600)
+def find_emerging_issues(version, archive_version):
+    # Baselines only look back a few weeks, so older archive months are never opened
+    return emerging_issues(load_history(archive_version, start=archive.since(EMERGING_DAYS)))
+
+# One compact layer per replica and centroid version: a row per ZIP code, not per report
+@st.cache_data(show_spinner=False, ttl=3600)
+def zip_heatmap(version, centroids, _data):
+    return build_layer(_data)
+
+# One full-text index per process, shared by every session
+@st.cache_resource(show_spinner=False)
+def get_report_index():
+    return DataFrameIndex(["description", "symptoms", "address"])
+
+def search_reports(query, limit=500):
+    snapshot = get_replica(SHEET_NAME).snapshot()
+    index = get_report_index()
+    index.sync(snapshot.data, snapshot.version)
+    return [doc_id for doc_id, _ in index.search(query, limit)]
+
+# Queue heavy work on the background pool; None (with a warning) if the queue is full
+def start_job(kind, fn, *args, **kwargs):
+    try:
+        return get_jobs().submit(kind, fn, *args, **kwargs)
+    except QueueFull:
+        st.warning("⏳ The server is busy with other analyses. Please try again in a moment.")
+        return None
+
+# Finished jobs, drawn by jobs.wait
+def show_export(job):
+    if job.status == "done":
+        st.download_button("📥 Download Reports CSV", job.result, "water_reports.csv", "text/csv")
+    else:
+        st.error(f"Export failed: {job.error}")
 
-def validate_zipcode(zipcode):
-    # Regex pattern for 5-digit or 9-digit (5 + hyphen + 4 digits) ZIP codes
-    pattern = r"^\d{5}(-\d{4})?$"
-    if re.match(pattern, zipcode):
-        return True
+def show_analysis(job):
+    if job.status == "done":
+        st.markdown(job.result)
     else:
-        return False
+        st.error(f"Error during analysis: {job.error}")
+
+def show_chart(job):
+    if job.status == "done" and job.result:
+        st.image(job.result, use_container_width=True)
+    elif job.status == "failed":
+        st.error(f"Could not draw the chart: {job.error}")
+
+# Write the full table back in one call and keep the replica and search index in step
+def save_reports(updated_data):
+    conn.update(worksheet=SHEET_NAME, data=updated_data)
+    get_replica(SHEET_NAME).replace(updated_data)
+    snapshot = get_replica(SHEET_NAME).snapshot()
+    get_report_index().sync(snapshot.data, snapshot.version)
+
+GRID_PAGE_SIZE = 12
+LITE_GALLERY_ROWS = 200
+EMERGING_DAYS = 7 * 10
+TREND_RANGES = {"Last 3 months": 90, "Last 12 months": 365, "All time": None}
 
 # App Setup
 st.set_page_config(page_title="Report a Water Source", layout="wide")
 st.title("🚰 Report a Water Source")
 
-with st.sidebar:
-  st.image(LOGO_URL, width=300)
+assets.sidebar_logo()
     
 st.markdown("""
 Report information about water sources in your area.
@@ -49,9 +123,15 @@ Report information about water sources in your area.
 SHEET_NAME = "Water-Report"
 conn = st.connection("gsheets", type=GSheetsConnection)
 
+# Reports older than WATERWATCH_HOT_DAYS move to the Parquet archive on a background thread (hourly)
+archive.get_archiver(SHEET_NAME)
+
+# Lite mode: one byte budget for everything this page run draws (None when lite mode is off)
+budget = lite.Budget() if lite.enabled() else None
+
 # Tabs
-report_tab, gallery_tab, table_tab, trends_tab = st.tabs(
-    ["📋 Report", "🖼️ Gallery", "📊 Tabular View", "📈 AI Analysis & Data"]
+report_tab, gallery_tab, table_tab, trends_tab, heatmap_tab = st.tabs(
+    ["📋 Report", "🖼️ Gallery", "📊 Tabular View", "📈 AI Analysis & Data", "🗺️ Heatmap"]
 )
 
 # REPORT TAB
@@ -65,14 +145,13 @@ with report_tab:
         st.subheader("📝 Description")
         description = st.text_area("What does the water look/smell like? Is it flowing or still?", max_chars=300)
         st.subheader("🚩 Concerns")
-        concerns = st.multiselect(
-            "Select any observed issues:",
-            ["Discoloration", "Foul smell", "Foam on surface", "Bugs or larvae", "Near industrial area", "Trash nearby", "Other"]
-        )
+        concerns = st.multiselect("Select any observed issues:", CONCERN_OPTIONS)
         st.subheader("🧭 Water Source Type")
-        source_type = st.selectbox("Choose type of source:", ["Faucet", "River/Stream", "Pipe Leak", "Fountain", "Rainwater Pool", "Other"])
-        used = st.radio("Did you use this water?", ["Yes", "No"])
+        source_type = st.selectbox("Choose type of source:", SOURCE_TYPES)
+        used = st.radio("Did you use this water?", USED_OPTIONS)
         symptoms = st.text_input("Any symptoms after use? (optional)")
+        st.subheader("📷 Photo")
+        photo = st.file_uploader("Attach a photo of the water source (optional)", type=PHOTO_TYPES)
 
 
         submitted = st.form_submit_button("Submit Report")
@@ -86,6 +165,22 @@ with report_tab:
                 # Ensure optional fields are handled properly (e.g., symptoms can be empty)
                 symptoms = symptoms if symptoms else "N/A"  # Default to "N/A" if empty
 
+                # Store the photo (EXIF stripped, thumbnail generated) and keep only its hash
+                photo_id = ""
+                if photo is not None:
+                    try:
+                        photo_id = store_photo(photo.getvalue())
+                    except InvalidPhoto:
+                        st.warning("⚠️ The photo could not be read, so the report was saved without it.")
+
+                # Coordinates let the map link this report to the nearest water source
+                coords = None
+                if OPENCAGE_API_KEY:
+                    try:
+                        coords = geocode(f"{address}, {zipcode}", OPENCAGE_API_KEY)
+                    except Exception:
+                        coords = None
+
                 # Build the report dictionary
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
                 report = {
@@ -97,6 +192,9 @@ with report_tab:
                     "type": source_type,
                     "used": used,
                     "symptoms": symptoms,
+                    "photo": photo_id,
+                    "lat": coords["lat"] if coords else "",
+                    "lon": coords["lng"] if coords else "",
                 }
 
                 # Load existing data and append the new report
@@ -106,42 +204,89 @@ with report_tab:
                 updated_data = pd.concat([existing_data, pd.DataFrame([report])], ignore_index=True)
 
                 # Update the Google Sheets or database
-                conn.update(worksheet=SHEET_NAME, data=updated_data)
+                save_reports(updated_data)
 
                 # Success message
                 st.success("✅ Report submitted successfully!")
 
+    # Bulk import for partner organizations
+    with st.expander("📦 Bulk Import (CSV or JSONL)"):
+        st.caption(
+            "Columns: address, zipcode, description, concerns (comma-separated), type, used, "
+            "symptoms (optional), timestamp (optional, defaults to now)."
+        )
+        upload = st.file_uploader("Upload reports file", type=["csv", "jsonl", "ndjson"])
+        if upload is not None and st.button("Validate and Import"):
+            with st.spinner("Validating reports..."):
+                valid_reports, import_errors, total_rows = validate_file(upload, upload.name)
+
+            if not valid_reports.empty:
+                # One batched write for every valid row
+                save_reports(pd.concat([load_data(), valid_reports], ignore_index=True))
+                st.success(f"✅ Imported {len(valid_reports)} of {total_rows} reports.")
+
+            if not import_errors.empty:
+                bad_rows = import_errors["row"].nunique()
+                st.error(f"❌ {bad_rows} rows were skipped because of errors.")
+                st.dataframe(import_errors, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "📥 Download Errors CSV",
+                    import_errors.to_csv(index=False).encode("utf-8"),
+                    "import_errors.csv",
+                    "text/csv",
+                )
+            elif valid_reports.empty:
+                st.info("The file has no reports.")
+
 # GALLERY TAB
-with gallery_tab:
+# Search, filter, sort and view changes rerun only this fragment
+@st.fragment
+def report_gallery(budget):
     st.header("🖼️ Report Gallery")
     df = load_data()
 
     if not df.empty:
-        # Ensure the 'zipcode' column is treated as strings
-        df['zipcode'] = df['zipcode'].astype(str).str.strip()
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-
         st.subheader("🔎 Filter Logs")
+        search_query = st.text_input("Search descriptions, symptoms and addresses:", placeholder="e.g. sewage, Main St")
         zipcodes = df['zipcode'].dropna().unique()
         selected_zip = st.selectbox("Filter by ZIP Code (optional):", ["All"] + sorted(zipcodes))
 
+        # Apply full-text search, keeping results in relevance order
+        if search_query:
+            matches = search_reports(search_query)
+            df = df.loc[[doc_id for doc_id in matches if doc_id in df.index]]
+
         # Apply ZIP code filter
         if selected_zip != "All":
             df = df[df['zipcode'] == selected_zip]
 
-        # Sort by time
-        sort_option = st.radio("Sort by:", ["Newest First", "Oldest First"], horizontal=True)
-        df = df.sort_values(by='timestamp', ascending=(sort_option == "Oldest First"))
+        # Parse timestamps only for the rows left after filtering
+        df = df.assign(timestamp=pd.to_datetime(df['timestamp'], errors='coerce'))
+
+        # Sort by time (or keep search ranking)
+        sort_options = (["Best Match"] if search_query else []) + ["Newest First", "Oldest First"]
+        sort_option = st.radio("Sort by:", sort_options, horizontal=True)
+        if sort_option != "Best Match":
+            df = df.sort_values(by='timestamp', ascending=(sort_option == "Oldest First"))
+
+        # Stream the filtered rows as dictionaries rather than copying them all at once
+        reports = iter_records(df)
 
-        # Convert filtered DataFrame to a list of dictionaries
-        reports = df.to_dict(orient='records')
+        # Lite mode: one text line per report, cut to the page's byte budget, no photos
+        if budget is not None:
+            lines = [
+                f"- 📍 **{report['address']}** ({report['timestamp']}) · {report['type']} · {report['concerns']} · {report['description']}"
+                for report in islice(reports, LITE_GALLERY_ROWS)
+            ]
+            budget.lines(lines, "{count} more reports not shown in lite mode.", total=len(df), key="gallery")
+            return
 
         # View selection: Detailed View or Grid View
         view_option = st.radio("Choose view:", ["Detailed View", "Grid View"], horizontal=True)
 
         # --- Detailed View ---
         if view_option == "Detailed View":
-            for report in reports:
+            for position, report in enumerate(reports):
                 with st.expander(f"📍 {report['address']} ({report['timestamp']})"):
                     st.write(f"**Source Type:** {report['type']} | **Used:** {report['used']}")
                     if report["concerns"]:
@@ -149,16 +294,29 @@ with gallery_tab:
                     if report["symptoms"]:
                         st.write(f"**Symptoms after use:** {report['symptoms']}")
                     st.write(f"**Description:** {report['description']}")
+                    # Collapsed expanders still send their content, so photos load only when asked for
+                    if has_photo(report.get("photo")) and st.toggle("📷 Show photo", key=f"detail_photo_{position}"):
+                        st.image(photo_path(report["photo"]), use_container_width=True)
 
         # --- Grid View ---
         elif view_option == "Grid View":
-            num_columns = 3
-            rows = [reports[i:i + num_columns] for i in range(0, len(reports), num_columns)]
+            # Page the grid so only a handful of thumbnails are sent per rerun
+            pages = max(1, -(-len(df) // GRID_PAGE_SIZE))
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+            start = (page - 1) * GRID_PAGE_SIZE
+            reports = enumerate(islice(reports, start, start + GRID_PAGE_SIZE), start)
 
-            for row in rows:
+            num_columns = 3
+            while row := list(islice(reports, num_columns)):
                 cols = st.columns(len(row))
-                for col, report in zip(cols, row):
+                for col, (position, report) in zip(cols, row):
                     with col:
+                        # Small WebP thumbnail by default, full image only on request
+                        if has_photo(report.get("photo")):
+                            if st.toggle("🔍 Full size", key=f"grid_photo_{position}"):
+                                st.image(photo_path(report["photo"]), use_container_width=True)
+                            else:
+                                st.image(thumbnail_path(report["photo"]), use_container_width=True)
                         st.markdown(f"**📍 {report['address']}**")
                         st.markdown(f"🕒 {report['timestamp']}")
                         st.markdown(f"**Type:** {report['type']}")
@@ -170,106 +328,212 @@ with gallery_tab:
     else:
         st.info("No reports yet.")
 
+with gallery_tab:
+    report_gallery(budget)
+
 # TABLE TAB
 with table_tab:
     st.subheader("📊 Tabular View")
     df = load_data()
     if not df.empty:
-        st.dataframe(df, use_container_width=True)
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button("📥 Download Reports CSV", csv, "water_reports.csv", "text/csv")
+        if budget is not None:
+            # Lite mode: the newest rows as text instead of the full interactive table
+            newest = df.sort_values("timestamp", ascending=False).head(LITE_GALLERY_ROWS)
+            budget.lines(
+                [f"- {row['timestamp']} · {row['zipcode']} · {row['type']} · {row['concerns']}" for row in iter_records(newest)],
+                "{count} more rows not shown in lite mode; prepare the CSV download below to get them all.",
+                total=len(df), key="table",
+            )
+        else:
+            st.dataframe(df, use_container_width=True)
+        # Older reports come from the archive, reading only the months in range.
+        # Reading and encoding run as a background job; the download appears when it's done.
+        export_range = st.radio("Export range:", ["Live reports"] + list(TREND_RANGES)[1:], horizontal=True)
+        if st.button("📦 Prepare CSV Download"):
+            days = TREND_RANGES.get(export_range)
+            start = archive.since(days) if days else None
+            snapshot = get_replica(SHEET_NAME).snapshot()
+            st.session_state.export_job = start_job(
+                "export", tasks.export_reports, df[df['timestamp'] >= start] if start else df, start, export_range != "Live reports",
+                key=("export", export_range, snapshot.version, archive.load_manifest()["version"]),
+            )
+        jobs.wait(st.session_state.get("export_job"), show_export)
     else:
         st.info("No reports to display.")
 
 # COMBINED TRENDS + AI ANALYSIS TAB
-with trends_tab:
+# Picking a ZIP or running the analysis reruns only this fragment
+@st.fragment
+def zip_trends(budget):
     st.header("📈 AI Analysis and Community Trends")
     data = load_data()
-    if not data.empty:
-        # Prepare data
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data['week'] = data['timestamp'].dt.to_period("W").astype(str)
-        trend_data = data.groupby(['zipcode', 'week']).size().reset_index(name='report_count')
-        zipcodes = trend_data['zipcode'].unique()
-
-        # Dropdown to select ZIP code
-        selected_zip = st.selectbox("Select a ZIP Code", zipcodes)
-        selected_data = trend_data[trend_data['zipcode'] == selected_zip]
+    manifest = archive.load_manifest()
+    if not data.empty or manifest["partitions"]:
+        # Spikes across every ZIP code and concern
+        st.subheader("🚨 Emerging Issues")
+        snapshot = get_replica(SHEET_NAME).snapshot()
+        issues = find_emerging_issues(snapshot.version, manifest["version"])
+        if issues.empty:
+            st.caption("No unusual spikes in reports this week.")
+        else:
+            st.caption("ZIP codes where a concern is being reported far more this week than in recent weeks.")
+            if budget is not None:
+                budget.lines(
+                    [f"- ZIP **{row.zipcode}** · {row.concern}: {row.this_week} this week, usually {row.baseline:g} (score {row.score:g})"
+                     for row in issues.itertuples()],
+                    "{count} more spikes not shown in lite mode.", key="emerging",
+                )
+            else:
+                st.dataframe(issues, use_container_width=True, hide_index=True)
+
+        st.markdown("---")
+
+        # Per-ZIP totals: live rows counted directly, archived ones from the manifest
+        zip_totals = archive.live_only(data, manifest)['zipcode'].value_counts().add(archive.zipcode_counts(manifest), fill_value=0)
+
+        # Dropdown to select ZIP code and time range
+        selected_zip = st.selectbox("Select a ZIP Code", sorted(zip_totals.index))
+        trend_range = st.radio("Time range:", list(TREND_RANGES), horizontal=True)
+        days = TREND_RANGES[trend_range]
+
+        # Only the archive months in range that hold this ZIP are read
+        zip_reports = load_history(manifest["version"], start=archive.since(days) if days else None, zipcodes=(selected_zip,))
+        versions = (selected_zip, trend_range, snapshot.version, manifest["version"])
        
         st.subheader(f"🤖 AI Analysis for ZIP Code {selected_zip}")
         
-        if not selected_data.empty:
+        if not zip_reports.empty:
              # Button to trigger AI Analysis
             aisubmit = st.button("🔍 Analyze This ZIP Code")
             if aisubmit:
-                try:
-                    from openai import OpenAI
-                    import openai
-                    client = OpenAI()
-
-                    # Use the latest 12 records for analysis
-                    weekly_summary = selected_data.tail(12).to_dict(orient='records')
-
-                    system_prompt = f"""
-                    You are an expert assistant reviewing a collection of user-submitted reports about unsanitary water issues.
-                    Each report includes a ZIP code, date, and a short description of the problem.
-
-                    Your task is to analyze the reports for ZIP code {selected_zip} and provide a structured summary of the specific water-related problems being reported.
-
-                    Instructions:
-                    - Group similar issues together (e.g., bad smell, unusual color, poor taste, contamination, etc.).
-                    - If certain issues happen repeatedly over time, point that out with approximate dates.
-                    - If certain neighborhoods, streets, or areas are mentioned frequently, highlight them.
-                    - Focus on the nature and severity of the water problems, not how many reports there are.
-                    - Do not include report counts or mention that more analysis is needed.
-
-                    Present the summary in a clear, organized format that would be useful to local officials or utility workers trying to understand what's happening in this area.
-                    """
-
-                    user_prompt = f"Here is the latest report data for ZIP {selected_zip}:\n{weekly_summary}"
-
-                    response = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": system_prompt.strip()},
-                            {"role": "user", "content": user_prompt},
-                        ],
-                        max_tokens=300,
-                        temperature=0.5,
-                    )
-
-                    st.markdown(response.choices[0].message.content)
-                except Exception as e:
-                    st.error(f"Error during analysis: {e}")
-        
-            # Plot trends for the selected ZIP code
+                system_prompt = f"""
+                You are an expert assistant reviewing a collection of user-submitted reports about unsanitary water issues.
+                Each report includes a ZIP code, date, and a short description of the problem.
+
+                Your task is to analyze the reports for ZIP code {selected_zip} and provide a structured summary of the specific water-related problems being reported.
+
+                Instructions:
+                - Group similar issues together (e.g., bad smell, unusual color, poor taste, contamination, etc.).
+                - If certain issues happen repeatedly over time, point that out with approximate dates.
+                - If certain neighborhoods, streets, or areas are mentioned frequently, highlight them.
+                - Focus on the nature and severity of the water problems, not how many reports there are.
+                - Do not include report counts or mention that more analysis is needed.
+
+                Present the summary in a clear, organized format that would be useful to local officials or utility workers trying to understand what's happening in this area.
+                """
+
+                # Map-reduce over the ZIP's actual reports on a job thread; chunk summaries are cached
+                st.session_state.analysis_job = start_job(
+                    "zip_analysis", summarize_reports, zip_reports, system_prompt, f"ZIP code {selected_zip}",
+                    key=("zip_analysis",) + versions, lane="thread", language="English", progress=jobs.report_progress,
+                )
+
+            # Shows a progress bar until this ZIP's analysis is ready
+            analysis_job = get_jobs().get(st.session_state.get("analysis_job"))
+            if analysis_job is not None and analysis_job.key[1] == selected_zip:
+                jobs.wait(analysis_job.id, show_analysis)
+
+            # Plot trends for the selected ZIP code (counted and drawn in a worker process)
             st.subheader(f"📍 Reports Over Time for ZIP Code: {selected_zip}")
-            fig, ax = plt.subplots(figsize=(12, 6))
-            ax.plot(selected_data['week'], selected_data['report_count'], marker='o', color='#5a7694', linestyle='-', linewidth=2)
-
-            # Show every Nth week
-            nth_week = 4
-            week_labels = selected_data['week'][::nth_week]
-            ax.set_xticks(selected_data['week'][::nth_week])
-            ax.set_xticklabels(week_labels, rotation=45, ha='right', fontsize=10)
-
-            ax.set_xlabel("Week", fontsize=12)
-            ax.set_ylabel("Number of Reports", fontsize=12)
-            ax.set_title(f"Water Source Reports Over Time - {selected_zip}", fontsize=14)
-
-            st.pyplot(fig)
+            if budget is not None:
+                # Lite mode: the latest weekly counts as text instead of a chart image
+                weekly = tasks.weekly_counts(zip_reports)
+                budget.lines(
+                    [f"- {row.week}: {row.report_count}" for row in weekly.tail(12).itertuples()],
+                    "{count} earlier weeks not shown in lite mode.", total=len(weekly), key="weekly",
+                )
+            else:
+                jobs.wait(start_job("trend_chart", tasks.trend_chart, zip_reports, selected_zip, key=("trend_chart",) + versions), show_chart)
 
             st.markdown("---")
             st.subheader("Top ZIP Codes by Total Reports")
 
             # Top 5 ZIPs
-            top_zips = trend_data.groupby('zipcode')['report_count'].sum().sort_values(ascending=False).head(5)
-            st.bar_chart(top_zips)
+            top_zips = zip_totals.sort_values(ascending=False).head(5)
+            if budget is not None:
+                budget.lines([f"- ZIP **{zipcode}**: {int(count)} reports" for zipcode, count in top_zips.items()],
+                             "{count} more ZIP codes not shown in lite mode.", key="top_zips")
+            else:
+                st.bar_chart(top_zips)
 
             st.markdown("---")
+
+            # Token, cost and latency totals for every AI feature on this server
+            with st.expander("🧾 AI Usage"):
+                usage = ledger.summary()
+                if usage.empty:
+                    st.caption("No AI calls yet.")
+                elif budget is not None:
+                    budget.lines(
+                        [f"- {row.feature} ({row.language}, {row.cache}): {row.calls} calls · ${row.cost_usd:.4f}" for row in usage.itertuples()],
+                        "{count} more usage rows not shown in lite mode.", key="usage",
+                    )
+                else:
+                    st.dataframe(usage, use_container_width=True, hide_index=True)
             
 
         else:
             st.info("No data available for the selected ZIP code.")
     else:
         st.info("No data available yet. Submit some reports to see trends!")
+
+with trends_tab:
+    zip_trends(budget)
+
+# HEATMAP TAB
+# Switching the metric reruns only this fragment
+@st.fragment
+def report_heatmap(budget):
+    st.header("🗺️ Report Heatmap")
+    snapshot = get_replica(SHEET_NAME).snapshot()
+    centroids = centroids_version()
+    cells, missing = zip_heatmap(snapshot.version, centroids, snapshot.data)
+    if missing and OPENCAGE_API_KEY:
+        # Geocode new ZIPs on a job thread (1 request/s); they appear on a later run
+        try:
+            get_jobs().submit("zip_centroids", fill_centroids, missing, OPENCAGE_API_KEY,
+                              key=("zip_centroids", snapshot.version, centroids), lane="thread")
+        except QueueFull:
+            pass
+        st.caption(f"Locating {len(missing)} more ZIP codes; they will appear shortly.")
+    if cells.empty:
+        st.info("No reports to map yet." if OPENCAGE_API_KEY else "Set OPENCAGE_API_KEY to place ZIP codes on the map.")
+        return
+
+    if budget is not None:
+        # Lite mode: ZIP codes ranked by severity instead of the WebGL map
+        ranked = cells.sort_values("severity", ascending=False)
+        lines = [f"{n}. ZIP **{row.zipcode}** · severity {row.severity:g} · {row.reports} reports" for n, row in enumerate(ranked.itertuples(), 1)]
+        budget.lines(lines, "{count} more ZIP codes not shown in lite mode.", key="heatmap")
+        return
+
+    metric = st.radio("Weight by:", ["Severity", "Number of reports"], horizontal=True)
+    weight = "severity" if metric == "Severity" else "reports"
+    view = pdk.ViewState(latitude=float(cells["lat"].mean()), longitude=float(cells["lon"].mean()), zoom=9)
+    heat = pdk.Layer(
+        "HeatmapLayer",
+        data=cells,
+        get_position=["lon", "lat"],
+        get_weight=weight,
+        aggregation="SUM",
+        radius_pixels=60,
+    )
+    # Invisible ZIP markers so each cell still has a tooltip
+    markers = pdk.Layer(
+        "ScatterplotLayer",
+        data=cells,
+        get_position=["lon", "lat"],
+        get_radius=12,
+        radius_units="pixels",
+        get_fill_color=[0, 0, 0, 0],
+        pickable=True,
+    )
+    st.pydeck_chart(pdk.Deck(
+        layers=[heat, markers],
+        initial_view_state=view,
+        tooltip={"text": "ZIP {zipcode}\n{reports} reports, severity {severity}"}
+    ))
+    st.caption("Severity counts each report once, plus extra weight for its concerns, and more again when the water was used, especially if symptoms followed.")
+
+with heatmap_tab:
+    report_heatmap(budget)
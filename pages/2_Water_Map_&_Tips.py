@@ -1,21 +1,32 @@
 import streamlit as st
 
+from waterwatch import profiling
+
+profiling.maybe_profile(__file__)
+
 # — require consent before loading anything else —
 if "consent_given" not in st.session_state or not st.session_state.consent_given:
     st.error("❌ Consent is required to use this app. Please return to the homepage.")
     st.stop()
 
-import openai
-import os
 import pandas as pd
 import pydeck as pdk
-import requests
+import bisect
+import logging
 import math
 import random
+import sqlite3
 
-# ✅ 1. Correct way to fetch key
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY
+import requests
+from gspread.exceptions import GSpreadException
+
+from waterwatch import answers, assets, lite, llm
+from waterwatch.geo import overpass_elements
+from waterwatch.httpclient import UpstreamUnavailable
+from waterwatch.registry import HEALTH_COLUMNS, get_registry
+from waterwatch.sheets import get_replica
+
+logger = logging.getLogger(__name__)
 
 # ✅ 2. Set page config first
 st.set_page_config(
@@ -24,26 +35,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ✅ 3. Custom styling
-st.markdown(
-    """
-    <style>
-    body { background-color: #f9fbfd; }
-    .main { max-width: 1000px; margin: auto; padding-top: 20px; }
-    h1, h2, h3 { text-align: center; color: #0077b6; font-size: 26px; }
-    .stButton>button {
-        background-color: #4DA8DA; color: white; font-size: 18px;
-        border-radius: 12px; padding: 10px 20px; width: 70%;
-        margin: 10px auto; display: block;
-    }
-    .stSelectbox, .stTextInput, .css-1d391kg, .css-1v0mbdj { font-size: 18px; }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
-
-# ✅ 4. Water image for Help Center
-water_image = "https://images.unsplash.com/photo-1589927986089-35812388d1b4"
+# ✅ 3. Custom styling (none in lite mode)
+if not lite.enabled():
+    st.markdown(
+        """
+        <style>
+        body { background-color: #f9fbfd; }
+        .main { max-width: 1000px; margin: auto; padding-top: 20px; }
+        h1, h2, h3 { text-align: center; color: #0077b6; font-size: 26px; }
+        .stButton>button {
+            background-color: #4DA8DA; color: white; font-size: 18px;
+            border-radius: 12px; padding: 10px 20px; width: 70%;
+            margin: 10px auto; display: block;
+        }
+        .stSelectbox, .stTextInput, .css-1d391kg, .css-1v0mbdj { font-size: 18px; }
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
 
 # —————— 5. Dynamic Resources Pool & Helper ——————
 RESOURCE_POOL = [
@@ -96,6 +105,16 @@ msgs = {
     "radius":         {"English": "Distance to Search (km)","Español": "Distancia de Búsqueda (km)"},
     "error_fetch":    {"English": "⚠️ Could not find any locations.", "Español": "⚠️ No se pudieron encontrar ubicaciones."},
     "no_results":     {"English": "No water sources found nearby.",  "Español": "No se encontraron fuentes cercanas."},
+    "health":         {"English": "Health",                 "Español": "Estado"},
+    "last_report":    {"English": "Last report",            "Español": "Último reporte"},
+    "no_reports":     {"English": "No reports",             "Español": "Sin reportes"},
+    "more_results":   {"English": "{count} more water sources not shown in lite mode.",
+                       "Español": "{count} fuentes más no se muestran en modo ligero."},
+    "open_map":       {"English": "map",                    "Español": "mapa"},
+    "health_legend":  {"English": "🔵 no recent problems · 🟠 some reports · 🔴 many recent reports",
+                       "Español": "🔵 sin problemas recientes · 🟠 algunos reportes · 🔴 muchos reportes recientes"},
+    "health_unavailable": {"English": "⚠️ Water source health scores are unavailable right now.",
+                           "Español": "⚠️ Los puntajes de estado de las fuentes no están disponibles en este momento."},
     "help_options": {
         "English": ["💡 Water Tips", "🧠 Ask for a Tip", "🏢 Resources"],
         "Español": ["💡 Consejos de Agua", "🧠 Pedir Consejo", "🏢 Recursos"]
@@ -132,59 +151,135 @@ def haversine(lat1, lon1, lat2, lon2):
 
 @st.cache_data(show_spinner=False, ttl=3600)
 def fetch_water_sources():
+    # Raises UpstreamUnavailable instead of returning an empty frame, so a
+    # failure is never cached for the full hour.
+    bbox = (37.20, -122.00, 37.45, -121.70)
+    query = f"""
+    [out:json];
+    node["amenity"="drinking_water"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
+    out;
+    """
+    elements, stale = overpass_elements(query)
+    df = pd.DataFrame([{
+        "id": el["id"],
+        "lat": el["lat"],
+        "lon": el["lon"],
+        "name": el.get("tags", {}).get("name", "Drinking Water")
+    } for el in elements], columns=["id", "lat", "lon", "name"])
+    return df, stale
+
+def load_water_sources():
     try:
-        bbox = (37.20, -122.00, 37.45, -121.70)
-        query = f"""
-        [out:json];
-        node["amenity"="drinking_water"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-        out;
-        """
-        resp = requests.get("http://overpass-api.de/api/interpreter", params={"data": query})
-        elements = resp.json().get("elements", [])
-        return pd.DataFrame([{
-            "lat": el["lat"],
-            "lon": el["lon"],
-            "name": el.get("tags", {}).get("name", "Drinking Water")
-        } for el in elements])
-    except:
-        return pd.DataFrame(columns=["lat", "lon", "name"])
+        df, stale = fetch_water_sources()
+    except UpstreamUnavailable:
+        return pd.DataFrame(columns=["id", "lat", "lon", "name"])
+    if stale:
+        # Serve the last good response now, but retry upstream on the next rerun.
+        fetch_water_sources.clear()
+    return df
+
+REPORTS_SHEET = "Water-Report"
+# Marker colour by health score: (lowest score, RGBA)
+HEALTH_COLORS = [(80, [0, 128, 255, 200]), (50, [255, 165, 0, 220]), (0, [220, 38, 38, 230])]
+
+def with_health(df):
+    # Link any new reports to their nearest source, then look up every source's score.
+    # Only reports the registry hasn't applied yet are matched against the sources.
+    registry = get_registry()
+    try:
+        snapshot = get_replica(REPORTS_SHEET).snapshot()
+    except (GSpreadException, requests.RequestException):
+        # Show the last known scores if the reports sheet can't be read
+        logger.warning("Could not read reports for water source health", exc_info=True)
+        snapshot = None
+    try:
+        if snapshot is not None:
+            registry.sync(snapshot.data, snapshot.version, df)
+        health = registry.health(df["id"])
+    except (sqlite3.Error, KeyError, ValueError):
+        # Registry database errors, or report columns it doesn't expect
+        logger.exception("Water source health scores are unavailable")
+        st.caption(msgs["health_unavailable"][language])
+        health = pd.DataFrame(columns=HEALTH_COLUMNS)
+    df = df.assign(source_id=df["id"].astype(str)).merge(health, on="source_id", how="left")
+    df["health"] = df["health"].fillna(100).astype(int)
+    df["reports"] = df["reports"].fillna(0).astype(int)
+    df["last_report_at"] = df["last_report_at"].fillna(msgs["no_reports"][language])
+    df["last_concerns"] = df["last_concerns"].fillna("")
+    df["color"] = df["health"].map(lambda score: next(color for floor, color in HEALTH_COLORS if score >= floor))
+    return df
+
+# —————— 9. Fragments ——————
+# Moving the slider reruns only this function, not the whole page.
+# (Fragments can't draw into the sidebar, so the slider lives above the map.)
+@st.fragment
+def water_map(df, center_lat, center_lon):
+    radius = st.slider(msgs["radius"][language], 0.5, 10.0, 5.0, 0.5)
+    filtered = df[df["distance_km"] <= radius]
+    if filtered.empty:
+        st.info(msgs["no_results"][language])
+    else:
+        view = pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=12)
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            data=filtered,
+            get_position=["lon", "lat"],
+            get_radius=30,
+            radius_scale=3,
+            radius_units="pixels",
+            radius_min_pixels=1,
+            radius_max_pixels=5,
+            pickable=True,
+            auto_highlight=True,
+            get_fill_color="color",
+            cluster=True
+        )
+        st.pydeck_chart(pdk.Deck(
+            layers=[layer],
+            initial_view_state=view,
+            tooltip={"html": "💧 <b>{name}</b><br/>"
+                             f"{msgs['health'][language]}: {{health}}/100<br/>"
+                             f"{msgs['last_report'][language]}: {{last_report_at}}<br/>"
+                             "{last_concerns}"}
+        ))
+        st.caption(msgs["health_legend"][language])
+
+# Lite mode: one precomputed, distance-sorted text list instead of the WebGL map
+@st.cache_data(show_spinner=False, ttl=600, max_entries=16)
+def distance_lines(df, language):
+    ranked = df.sort_values("distance_km")
+    lines = [
+        f"{n}. 💧 **{row.name}** · {row.distance_km:.1f} km · {msgs['health'][language]} {row.health}/100 · "
+        f"[{msgs['open_map'][language]}](https://maps.google.com/?q={row.lat:.5f},{row.lon:.5f})"
+        for n, row in enumerate(ranked.itertuples(index=False), 1)
+    ]
+    return ranked["distance_km"].tolist(), lines
+
+@st.fragment
+def water_list(df):
+    radius = st.slider(msgs["radius"][language], 0.5, 10.0, 5.0, 0.5)
+    distances, lines = distance_lines(df[["name", "lat", "lon", "distance_km", "health"]], language)
+    count = bisect.bisect_right(distances, radius)
+    if not count:
+        st.info(msgs["no_results"][language])
+    else:
+        lite.Budget().lines(lines[:count], msgs["more_results"][language])
 
 # —————— 10. Pages ——————
 if page == msgs["map"][language]:
     st.header(msgs["map"][language])
-    df = fetch_water_sources()
+    df = load_water_sources()
     if df.empty:
         st.error(msgs["error_fetch"][language])
     else:
         center_lat, center_lon = 37.3382, -121.8863
-        radius = st.sidebar.slider(msgs["radius"][language], 0.5, 10.0, 5.0, 0.5)
         df["distance_km"] = df.apply(
             lambda r: haversine(center_lat, center_lon, r["lat"], r["lon"]), axis=1
         )
-        filtered = df[df["distance_km"] <= radius]
-        if filtered.empty:
-            st.info(msgs["no_results"][language])
+        if lite.enabled():
+            water_list(with_health(df))
         else:
-            view = pdk.ViewState(latitude=center_lat, longitude=center_lon, zoom=12)
-            layer = pdk.Layer(
-                "ScatterplotLayer",
-                data=filtered,
-                get_position=["lon", "lat"],
-                get_radius=30,
-                radius_scale=3,
-                radius_units="pixels",
-                radius_min_pixels=1,
-                radius_max_pixels=5,
-                pickable=True,
-                auto_highlight=True,
-                get_fill_color=[0, 128, 255, 200],
-                cluster=True
-            )
-            st.pydeck_chart(pdk.Deck(
-                layers=[layer],
-                initial_view_state=view,
-                tooltip={"text": "💧 " + ("Agua Potable" if language=="Español" else "Drinking Water")}
-            ))
+            water_map(with_health(df), center_lat, center_lon)
 
 elif page == msgs["help_center"][language]:
     st.header(msgs["help_center"][language])
@@ -263,16 +358,19 @@ elif page == msgs["help_center"][language]:
             value=example if example else ""
         )
         if user_question and st.button("🔎 Get Water Tip" if language=="English" else "🔎 Obtener Consejo"):
-            with st.spinner("Thinking..."):
-                try:
-                    prompt = f"Answer simply for someone living outdoors: {user_question}"
-                    resp = openai.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[{"role":"user","content":prompt}]
-                    )
-                    st.success(resp.choices[0].message.content.strip())
-                except:
-                    st.error("⚠️ Sorry, couldn't generate a tip. Please try again later.")
+            # Common questions are answered instantly from the local guide
+            local_answer = answers.lookup(user_question, language)
+            if local_answer:
+                st.success(local_answer.text)
+                st.caption("From the WaterWatch water safety guide." if language=="English"
+                           else "De la guía de seguridad del agua de WaterWatch.")
+            else:
+                with st.spinner("Thinking..."):
+                    try:
+                        prompt = f"Answer simply for someone living outdoors: {user_question}"
+                        st.success(llm.chat([{"role":"user","content":prompt}], feature="tip", language=language))
+                    except:
+                        st.error("⚠️ Sorry, couldn't generate a tip. Please try again later.")
 
     # — Resources Page with Refresh Button —
     elif st.session_state.current_page == "resources":
@@ -290,6 +388,4 @@ elif page == msgs["help_center"][language]:
         st.markdown(st.session_state["resources_md"])
 
 # Sidebar logo
-LOGO_URL = "https://raw.githubusercontent.com/blam1921/FULL-PROTOTYPE/refs/heads/main/waterwatchlogov2.png"
-with st.sidebar:
-    st.image(LOGO_URL, width=300)
+assets.sidebar_logo()
@@ -1,11 +1,20 @@
 import streamlit as st
 import os
-import requests
 from datetime import datetime, timedelta
 import pandas as pd
 from streamlit_gsheets import GSheetsConnection
-from openai import OpenAI
 import ast
+import math
+import re
+
+from waterwatch import assets, lite, llm, profiling
+from waterwatch.alerts import LANGUAGES, MESSAGE_COLUMNS, alert_message, canonical_type, parse_messages, type_label, type_labels
+from waterwatch.feed import get_publisher
+from waterwatch.geo import geocode
+from waterwatch.notify import get_dispatcher
+from waterwatch.sheets import get_replica, iter_records
+
+profiling.maybe_profile(__file__)
 
 # Check user consent
 if "consent_given" not in st.session_state or not st.session_state.consent_given:
@@ -45,53 +54,66 @@ msgs = {
     "created_at": {"English": "**Created At:**", "Español": "**Creado el:**"},
     "time_remaining": {"English": "🕒 **Time Remaining:**", "Español": "🕒 **Tiempo Restante:**"},
     "expired_message": {"English": "❌ This message has expired and will be removed shortly.", "Español": "❌ Este mensaje ha expirado y será eliminado pronto."},
+    "expires_at": {"English": "**Expires At:**", "Español": "**Expira el:**"},
     "coordinates": {"English": "**Coordinates:**", "Español": "**Coordenadas:**"},
     "no_alerts": {"English": "No alerts to display.", "Español": "No hay alertas para mostrar."},
     "download_bulletin": {"English": "📥 Download Bulletin as Text File", "Español": "📥 Descargar Boletín como Archivo de Texto"},
+    "more_alerts": {"English": "{count} more alerts not shown in lite mode.", "Español": "{count} alertas más no se muestran en modo ligero."},
+    "expires": {"English": "until", "Español": "hasta"},
+    "open_map": {"English": "map", "Español": "mapa"},
+    "feed_links": {"English": "Partners: active alerts are also published as [JSON](/app/static/feed/alerts.json), [iCalendar](/app/static/feed/alerts.ics) and [text](/app/static/feed/alerts.txt).",
+                   "Español": "Organizaciones aliadas: las alertas activas también se publican como [JSON](/app/static/feed/alerts.json), [iCalendar](/app/static/feed/alerts.ics) y [texto](/app/static/feed/alerts.txt)."},
+    "notifications_queued": {"English": "📲 Text notifications are being sent to subscribers.", "Español": "📲 Se están enviando notificaciones por mensaje de texto a los suscriptores."},
+    "subscribe_title": {"English": "📲 Get Text Alerts", "Español": "📲 Recibir Alertas por Mensaje de Texto"},
+    "phone": {"English": "Mobile Number", "Español": "Número de Celular"},
+    "subscribe_types": {"English": "Resource Types (leave empty for all)", "Español": "Tipos de Recurso (deja vacío para todos)"},
+    "subscribe_zip": {"English": "ZIP Code (optional)", "Español": "Código Postal (opcional)"},
+    "subscribe_button": {"English": "Subscribe", "Español": "Suscribirse"},
+    "subscribed": {"English": "✅ You're subscribed to text alerts.", "Español": "✅ Estás suscrito a las alertas por mensaje de texto."},
+    "invalid_phone": {"English": "❌ Please enter a valid mobile number.", "Español": "❌ Ingresa un número de celular válido."},
 }
 
-# Resource types multilingual
-resource_types = {
-    "English": ["Water Station", "Free Meal", "Shower", "Health Clinic"],
-    "Español": ["Estación de Agua", "Comida Gratis", "Ducha", "Clínica de Salud"]
-}
-
-# Map Spanish resource types back to English for AI
-resource_type_english_map = {
-    "Estación de Agua": "Water Station",
-    "Comida Gratis": "Free Meal",
-    "Ducha": "Shower",
-    "Clínica de Salud": "Health Clinic"
-}
+# Resource types multilingual (alerts always store the English type)
+resource_types = {lang: type_labels(lang) for lang in LANGUAGES}
 
 # API keys
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENCAGE_API_KEY = os.getenv('OPENCAGE_API_KEY')
-client = OpenAI()
 
 # Google Sheets Setup
 SHEET_NAME = "alerts"
 conn = st.connection("gsheets", type=GSheetsConnection)
 ALERT_EXPIRATION_HOURS = 48
+COUNTDOWN_REFRESH = "60s"
 coords = None
 
+def save_data(data):
+    conn.update(worksheet=SHEET_NAME, data=data)
+    get_replica(SHEET_NAME).replace(data)
+
 def load_data():
-    data = conn.read(worksheet=SHEET_NAME, ttl=5)
-    data = data.dropna(how="all")
+    # Zero-copy view of the shared snapshot; only copied if something expired
+    data = get_replica(SHEET_NAME).snapshot().view()
     now = datetime.now()
     if not data.empty:
-        data['timestamp_dt'] = pd.to_datetime(data['timestamp'])
-        not_expired = data['timestamp_dt'] + timedelta(hours=ALERT_EXPIRATION_HOURS) > now
-        expired = data[~not_expired]
-        if not expired.empty:
-            data = data[not_expired].drop(columns=["timestamp_dt"])
-            conn.update(worksheet=SHEET_NAME, data=data)
-        else:
-            data = data.drop(columns=["timestamp_dt"])
+        not_expired = pd.to_datetime(data['timestamp']) + timedelta(hours=ALERT_EXPIRATION_HOURS) > now
+        if "expiration_time" in data.columns:
+            # Also drop alerts whose own timer has run out
+            not_expired &= ~(pd.to_datetime(data['expiration_time'], errors='coerce') <= now)
+        if not not_expired.all():
+            data = data[not_expired]
+            save_data(data)
     return data
 
 alerts = load_data()
 
+# Republish the partner feed only if the active alerts may have changed
+def refresh_feed():
+    snapshot = get_replica(SHEET_NAME).snapshot()
+    return get_publisher().refresh(snapshot.data, snapshot.version)
+
+feed = refresh_feed()
+
 # App Interface
 st.title(msgs["title"][language])
 st.caption(msgs["caption_main"][language])
@@ -109,10 +131,8 @@ with st.form(key='resource_form'):
 # Autofill Coordinates
 if address and OPENCAGE_API_KEY:
     try:
-        geo_url = f"https://api.opencagedata.com/geocode/v1/json?q={address}&key={OPENCAGE_API_KEY}"
-        geo_response = requests.get(geo_url).json()
-        if geo_response['results']:
-            coords = geo_response['results'][0]['geometry']
+        coords = geocode(address, OPENCAGE_API_KEY)
+        if coords:
             st.success(f"{msgs['coordinates_found'][language]} {coords['lat']}, {coords['lng']}")
         else:
             st.error(msgs["no_coordinates"][language])
@@ -121,36 +141,37 @@ if address and OPENCAGE_API_KEY:
 
 # Submit Resource
 if submit_button:
-    if client:
-        # Map back to English if necessary
-        resource_type_for_ai = resource_type_english_map.get(resource_type, resource_type)
-
-        # Dynamic system and prompt based on language
-        if language == "Español":
-            system_message = "Eres un asistente que escribe alertas comunitarias cortas y amistosas en español."
-            user_prompt = f"Estás ayudando a personas sin hogar a encontrar recursos. Escribe una alerta estilo SMS corta y positiva sobre un nuevo {resource_type} disponible en {location_name}, {address}. Está disponible {hours}."
-        else:
-            system_message = "You write short, friendly community alerts."
-            user_prompt = f"You are helping homeless users find resources. Write a very short, friendly SMS-style alert about a new {resource_type_for_ai} available at {location_name}, {address}. It is available {hours}. Keep it positive and encouraging."
+    if OPENAI_API_KEY:
+        # Stored and sent to the model in English, whatever the submitter's language
+        resource_type_for_ai = canonical_type(resource_type)
+
+        # One call writes the alert in both languages, so nobody needs a translation later
+        system_message = (
+            "You write short, friendly community alerts in English and Spanish. "
+            'Reply with a JSON object with exactly two keys, "English" and "Español", each holding the same alert in that language.'
+        )
+        user_prompt = f"You are helping homeless users find resources. Write a very short, friendly SMS-style alert about a new {resource_type_for_ai} available at {location_name}, {address}. It is available {hours}. Keep it positive and encouraging."
 
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
+            messages = parse_messages(llm.chat_json(
+                [
                     {"role": "system", "content": system_message},
                     {"role": "user", "content": user_prompt}
                 ],
+                feature="bulletin_alert",
+                language=language,
                 temperature=0.7,
-                max_tokens=100
-            )
-            message = response.choices[0].message.content.strip()
+                max_tokens=250
+            ))
+            message = messages[language]
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
             expiration_time = datetime.now() + timedelta(minutes=timer_duration)
 
             alert = {
                 "timestamp": timestamp,
-                "type": resource_type,
-                "message": message,
+                "type": resource_type_for_ai,
+                MESSAGE_COLUMNS["English"]: messages["English"],
+                MESSAGE_COLUMNS["Español"]: messages["Español"],
                 "location_name": location_name,
                 "address": address,
                 "coordinates": coords,
@@ -158,12 +179,17 @@ if submit_button:
                 "expiration_time": expiration_time.strftime("%Y-%m-%d %H:%M")
             }
             updated_alerts = pd.concat([alerts, pd.DataFrame([alert])], ignore_index=True)
-            conn.update(worksheet=SHEET_NAME, data=updated_alerts)
+            save_data(updated_alerts)
+            feed = refresh_feed()
 
             st.success(msgs["success_message"][language])
             st.info(message)
 
-            if coords:
+            # Fan out to SMS subscribers in the background
+            get_dispatcher().publish(resource_type_for_ai, address, messages)
+            st.caption(msgs["notifications_queued"][language])
+
+            if coords and not lite.enabled():
                 st.map([{"lat": coords['lat'], "lon": coords['lng']}])
 
         except Exception as e:
@@ -171,60 +197,108 @@ if submit_button:
     else:
         st.error(msgs["no_openai_key"][language])
 
+# SMS Subscriptions
+with st.expander(msgs["subscribe_title"][language]):
+    with st.form(key="subscribe_form"):
+        phone = st.text_input(msgs["phone"][language], placeholder="+1 408 555 0123")
+        subscribe_types = st.multiselect(msgs["subscribe_types"][language], resource_types[language])
+        subscribe_zip = st.text_input(msgs["subscribe_zip"][language])
+        subscribe_button = st.form_submit_button(msgs["subscribe_button"][language])
+    if subscribe_button:
+        digits = re.sub(r"\D", "", phone)
+        if not 10 <= len(digits) <= 15:
+            st.error(msgs["invalid_phone"][language])
+        else:
+            get_dispatcher().subscribe(
+                "+" + (digits if len(digits) > 10 else "1" + digits),
+                [canonical_type(kind) for kind in subscribe_types],
+                subscribe_zip.strip()[:5] or None,
+                language,
+            )
+            st.success(msgs["subscribed"][language])
+
 st.divider()
 
 # Community Announcements
 st.header(msgs["community_announcements"][language])
 st.caption(msgs["safety_note"][language])
 
-filter_type = st.selectbox(msgs["filter"][language], ["All"] + resource_types[language])
-alerts_dicts = alerts.to_dict(orient="records")
-
-filtered_alerts = [alert for alert in alerts_dicts if filter_type == "All" or alert["type"] == filter_type]
-
-if filtered_alerts:
-    for idx, alert in enumerate(filtered_alerts, 1):
-        with st.expander(f"🔔 {idx}. {alert['message']}"):
-            st.markdown(f"{msgs['resource_type'][language]} {alert['type']}")
-            st.markdown(f"{msgs['location'][language]} {alert['location_name']}")
-            st.markdown(f"{msgs['address_field'][language]} {alert['address']}")
-            st.markdown(f"{msgs['hours_field'][language]} {alert['hours']}")
-            st.markdown(f"{msgs['created_at'][language]} {alert['timestamp']}")
-
-            expiration_time = datetime.strptime(alert['expiration_time'], "%Y-%m-%d %H:%M")
-            time_left = expiration_time - datetime.now()
-            if time_left.total_seconds() > 0:
-                st.markdown(f"{msgs['time_remaining'][language]} {str(time_left).split('.')[0]}")
-            else:
-                # Automatically remove expired alerts from the displayed list
-                alerts = alerts[alerts['timestamp'] != alert['timestamp']]
-                conn.update(worksheet=SHEET_NAME, data=alerts)
-                st.markdown(msgs["expired_message"][language])
-
-            if alert.get('coordinates'):
-                coords = alert['coordinates']
-                if isinstance(coords, str):
-                    try:
-                        coords = ast.literal_eval(coords)
-                    except Exception as e:
-                        st.error(f"Error parsing coordinates: {e}")
-                        coords = None
-
-                if coords and isinstance(coords, dict) and 'lat' in coords and 'lng' in coords:
-                    google_maps_url = f"https://www.google.com/maps?q={coords['lat']},{coords['lng']}"
-                    st.markdown(f"{msgs['coordinates'][language]} [Latitude: {coords['lat']}, Longitude: {coords['lng']}]({google_maps_url})", unsafe_allow_html=True)
-                    st.map([{"lat": coords['lat'], "lon": coords['lng']}])
-else:
-    st.info(msgs["no_alerts"][language])
+# One fragment counts down every listed alert, once a minute, without rerunning the page.
+# Expired alerts are dropped from the sheet by load_data() on the next full run.
+@st.fragment(run_every=COUNTDOWN_REFRESH)
+def time_remaining(alerts):
+    now = datetime.now()
+    lines = []
+    for idx, alert in enumerate(iter_records(alerts), 1):
+        minutes_left = math.ceil((datetime.strptime(alert['expiration_time'], "%Y-%m-%d %H:%M") - now).total_seconds() / 60)
+        if minutes_left > 0:
+            lines.append(f"- {idx}. {alert_message(alert, language)}: {minutes_left // 60}:{minutes_left % 60:02d}")
+        else:
+            lines.append(f"- {idx}. {msgs['expired_message'][language]}")
+    st.markdown(msgs["time_remaining"][language] + "\n" + "\n".join(lines))
+
+# Lite mode: each alert as one line of text with a map link, built once per data version
+@st.cache_data(show_spinner=False, ttl=600, max_entries=32)
+def alert_lines(version, _alerts, filter_type, language):
+    lines = []
+    for alert in iter_records(_alerts):
+        try:
+            coords = ast.literal_eval(alert['coordinates']) if isinstance(alert.get('coordinates'), str) else None
+        except (ValueError, SyntaxError):
+            coords = None
+        link = f" · [{msgs['open_map'][language]}](https://maps.google.com/?q={coords['lat']},{coords['lng']})" if isinstance(coords, dict) and 'lat' in coords else ""
+        lines.append(
+            f"- 🔔 **{alert_message(alert, language)}** {type_label(alert['type'], language)} · {alert['location_name']} · "
+            f"{alert['address']} · {alert['hours']} · {msgs['expires'][language]} {alert['expiration_time']}{link}"
+        )
+    return lines
+
+# Changing the filter reruns only the announcements list
+@st.fragment
+def announcements(alerts):
+    filter_type = st.selectbox(msgs["filter"][language], ["All"] + resource_types[language])
+    filtered_alerts = alerts if filter_type == "All" or alerts.empty else alerts[alerts["type"].map(canonical_type) == canonical_type(filter_type)]
+
+    if not filtered_alerts.empty and lite.enabled():
+        # No expanders, maps or live countdowns, and no more than the page's byte budget
+        version = get_replica(SHEET_NAME).snapshot().version
+        lite.Budget().lines(alert_lines(version, filtered_alerts, filter_type, language), msgs["more_alerts"][language])
+    elif not filtered_alerts.empty:
+        time_remaining(filtered_alerts)
+        for idx, alert in enumerate(iter_records(filtered_alerts), 1):
+            with st.expander(f"🔔 {idx}. {alert_message(alert, language)}"):
+                st.markdown(f"{msgs['resource_type'][language]} {type_label(alert['type'], language)}")
+                st.markdown(f"{msgs['location'][language]} {alert['location_name']}")
+                st.markdown(f"{msgs['address_field'][language]} {alert['address']}")
+                st.markdown(f"{msgs['hours_field'][language]} {alert['hours']}")
+                st.markdown(f"{msgs['created_at'][language]} {alert['timestamp']}")
+                st.markdown(f"{msgs['expires_at'][language]} {alert['expiration_time']}")
+
+                if alert.get('coordinates'):
+                    coords = alert['coordinates']
+                    if isinstance(coords, str):
+                        try:
+                            coords = ast.literal_eval(coords)
+                        except Exception as e:
+                            st.error(f"Error parsing coordinates: {e}")
+                            coords = None
+
+                    if coords and isinstance(coords, dict) and 'lat' in coords and 'lng' in coords:
+                        google_maps_url = f"https://www.google.com/maps?q={coords['lat']},{coords['lng']}"
+                        st.markdown(f"{msgs['coordinates'][language]} [Latitude: {coords['lat']}, Longitude: {coords['lng']}]({google_maps_url})", unsafe_allow_html=True)
+                        st.map([{"lat": coords['lat'], "lon": coords['lng']}])
+    else:
+        st.info(msgs["no_alerts"][language])
+
+announcements(alerts)
 
 st.download_button(
     label=msgs["download_bulletin"][language],
-    data="\n\n".join([a["message"] for a in alerts_dicts]),
+    data=feed.files["txt"],
     file_name="alerts.txt",
     mime="text/plain"
 )
+st.caption(msgs["feed_links"][language])
 
 # Logo
-LOGO_URL = "https://raw.githubusercontent.com/blam1921/FULL-PROTOTYPE/refs/heads/main/waterwatchlogov2.png"
-with st.sidebar:
-    st.image(LOGO_URL, width=300)
+assets.sidebar_logo()
@@ -0,0 +1,56 @@
+"""Bulletin alert schema: language-independent resource types and bilingual messages.
+
+Alerts store their `type` in English and their text in one column per
+language, so every viewer reads the same alert in their own language without
+any further API calls. Alerts saved before this only have a single `message`
+(and possibly a Spanish `type`); the helpers below fall back to those.
+"""
+LANGUAGES = ["English", "Español"]
+MESSAGE_COLUMNS = {"English": "message_en", "Español": "message_es"}
+
+# Stored type -> label shown in each language
+RESOURCE_TYPES = {
+    "Water Station": {"English": "Water Station", "Español": "Estación de Agua"},
+    "Free Meal": {"English": "Free Meal", "Español": "Comida Gratis"},
+    "Shower": {"English": "Shower", "Español": "Ducha"},
+    "Health Clinic": {"English": "Health Clinic", "Español": "Clínica de Salud"},
+}
+_CANONICAL = {label: kind for kind, labels in RESOURCE_TYPES.items() for label in labels.values()}
+
+
+def _text(value):
+    return value if isinstance(value, str) else ""
+
+
+def type_labels(language):
+    return [labels[language] for labels in RESOURCE_TYPES.values()]
+
+
+def canonical_type(value):
+    """The stored (English) type for a label in any language."""
+    return _CANONICAL.get(_text(value).strip(), _text(value).strip())
+
+
+def type_label(value, language):
+    kind = canonical_type(value)
+    return RESOURCE_TYPES[kind][language] if kind in RESOURCE_TYPES else kind
+
+
+def alert_message(alert, language):
+    """The alert's text in `language`, falling back to the other language and then `message`."""
+    for column in [MESSAGE_COLUMNS[language]] + list(MESSAGE_COLUMNS.values()) + ["message"]:
+        text = _text(alert.get(column)).strip()
+        if text:
+            return text
+    return ""
+
+
+def parse_messages(reply):
+    """{language: text} from the model's JSON reply; raises ValueError if a language is missing."""
+    if not isinstance(reply, dict):
+        raise ValueError("reply is not a JSON object")
+    messages = {language: _text(reply.get(language)).strip() for language in LANGUAGES}
+    missing = [language for language, text in messages.items() if not text]
+    if missing:
+        raise ValueError(f"reply has no {', '.join(missing)} message")
+    return messages
@@ -0,0 +1,77 @@
+"""Spike detection over weekly report counts for every (zipcode, concern) pair.
+
+All series are laid out as columns of one week-indexed matrix so baselines and
+anomaly scores are computed in a single vectorized pass, however many ZIP
+codes there are.
+"""
+import numpy as np
+import pandas as pd
+
+CONCERN_SEPARATOR = ","
+
+
+def weekly_concern_counts(data, as_of=None):
+    """Weekly report counts: one row per week, one column per (zipcode, concern).
+
+    Weeks with no reports are filled with zeros up to the week containing `as_of`.
+    """
+    timestamps = pd.to_datetime(data["timestamp"], errors="coerce")
+    frame = pd.DataFrame({
+        "week": timestamps.dt.to_period("W").dt.start_time,
+        "zipcode": data["zipcode"].astype(str).str.strip(),
+        "concern": data["concerns"].fillna("").astype(str).str.split(CONCERN_SEPARATOR),
+    }).dropna(subset=["week"])
+    frame = frame.explode("concern")
+    frame["concern"] = frame["concern"].str.strip()
+    frame = frame[frame["concern"] != ""]
+    if frame.empty:
+        return pd.DataFrame()
+
+    counts = frame.groupby(["week", "zipcode", "concern"]).size().unstack(["zipcode", "concern"], fill_value=0)
+    last_week = pd.Timestamp(as_of or pd.Timestamp.now()).to_period("W").start_time
+    weeks = pd.date_range(counts.index.min(), max(counts.index.max(), last_week), freq="7D")
+    return counts.reindex(weeks, fill_value=0)
+
+
+def emerging_issues(data, as_of=None, method="zscore", window=8, halflife=3.0,
+                    min_reports=3, threshold=2.0, limit=20):
+    """Rank (zipcode, concern) pairs whose latest weekly count is far above their baseline.
+
+    `method` is "zscore" (rolling mean/std over the previous `window` weeks) or
+    "ewma" (exponentially weighted mean/std with the given `halflife`). The
+    latest week never contributes to its own baseline.
+    """
+    counts = weekly_concern_counts(data, as_of)
+    if counts.empty:
+        return pd.DataFrame(columns=["zipcode", "concern", "this_week", "baseline", "score"])
+
+    # Only the tail of the history can influence the latest score.
+    history = window + 1 if method == "zscore" else int(halflife * 8) + 1
+    recent = counts.tail(history).astype(float)
+    previous = recent.iloc[:-1]
+    latest = recent.iloc[-1].to_numpy()
+
+    if method == "zscore":
+        baseline = previous.tail(window).mean().to_numpy()
+        spread = previous.tail(window).std(ddof=0).to_numpy()
+    elif method == "ewma":
+        weighted = previous.ewm(halflife=halflife)
+        baseline = weighted.mean().iloc[-1].to_numpy() if len(previous) else np.zeros_like(latest)
+        spread = np.sqrt(weighted.var(bias=True).iloc[-1].to_numpy()) if len(previous) else np.zeros_like(latest)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    baseline = np.nan_to_num(baseline)
+    # Counts are small and sparse, so floor the spread at the Poisson noise level.
+    spread = np.maximum(np.nan_to_num(spread), np.sqrt(np.maximum(baseline, 1.0)))
+    scores = (latest - baseline) / spread
+
+    result = pd.DataFrame({
+        "zipcode": counts.columns.get_level_values("zipcode"),
+        "concern": counts.columns.get_level_values("concern"),
+        "this_week": latest.astype(int),
+        "baseline": baseline.round(2),
+        "score": scores.round(2),
+    })
+    result = result[(result["this_week"] >= min_reports) & (result["score"] >= threshold)]
+    return result.sort_values(["score", "this_week"], ascending=False).head(limit).reset_index(drop=True)
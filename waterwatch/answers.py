@@ -0,0 +1,168 @@
+"""Instant answers to common water-safety questions from a curated bilingual guide.
+
+Questions are matched against the guide with BM25. Only a confident match
+(most of the question's meaningful words found in one entry) is answered
+locally; anything else is left for the LLM.
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+
+from waterwatch.search import SearchIndex, tokenize
+
+MIN_CONFIDENCE = 0.6
+
+# Question words carry no topic, so they shouldn't count for or against a match.
+QUESTION_WORDS = frozenset(
+    "can could do does how i if is many me much my per should what when where which will you "
+    "como cual cuando cuanta cuanto debo donde me mi puedo hay se si"
+    .split()
+)
+
+# Each entry: keywords/question phrasings to match on, and the answer per language.
+GUIDE = [
+    {
+        "match": {
+            "English": "How long should I boil water to make it safe? boiling time minutes boil",
+            "Español": "¿Cuánto tiempo debo hervir el agua? tiempo hervir minutos hervirla",
+        },
+        "answer": {
+            "English": "Bring the water to a full rolling boil for at least 1 minute (3 minutes if you are high up in the mountains). Let it cool in a clean, covered container before drinking.",
+            "Español": "Hierve el agua a borbotones por lo menos 1 minuto (3 minutos si estás en la montaña a gran altura). Déjala enfriar en un recipiente limpio y tapado antes de beberla.",
+        },
+    },
+    {
+        "match": {
+            "English": "Is rainwater safe to drink? rain water collect drink rainwater",
+            "Español": "¿Es seguro beber agua de lluvia? lluvia recoger beber",
+        },
+        "answer": {
+            "English": "Rainwater can pick up dirt, bird droppings and chemicals from roofs and containers. Collect it in a clean container, let any dirt settle, then boil it for 1 minute before drinking.",
+            "Español": "El agua de lluvia puede contener tierra, excremento de aves y químicos de techos y recipientes. Recógela en un recipiente limpio, deja que la tierra se asiente y hiérvela 1 minuto antes de beberla.",
+        },
+    },
+    {
+        "match": {
+            "English": "How do I clean river water to drink? river stream creek lake pond water clean purify",
+            "Español": "¿Cómo limpiar el agua de un río para beber? rio arroyo lago estanque limpiar purificar",
+        },
+        "answer": {
+            "English": "Never drink river or creek water untreated. Let it settle, pour it through a clean cloth to remove dirt, then boil it for 1 minute. If you can't boil it, add 2 drops of plain unscented bleach per liter and wait 30 minutes.",
+            "Español": "Nunca bebas agua de río o arroyo sin tratarla. Deja que se asiente, pásala por una tela limpia para quitar la tierra y hiérvela 1 minuto. Si no puedes hervirla, agrega 2 gotas de cloro sin aroma por litro y espera 30 minutos.",
+        },
+    },
+    {
+        "match": {
+            "English": "How to store water safely outdoors? store storage keep container bottle outside",
+            "Español": "¿Cómo almacenar agua de manera segura al aire libre? almacenar guardar recipiente botella afuera",
+        },
+        "answer": {
+            "English": "Keep drinking water in a clean container with a tight lid, out of direct sun. Pour it out instead of dipping cups or hands in, and don't reuse containers that held chemicals.",
+            "Español": "Guarda el agua potable en un recipiente limpio con tapa bien cerrada y fuera del sol directo. Sírvela sin meter vasos ni manos, y no reutilices recipientes que tuvieron químicos.",
+        },
+    },
+    {
+        "match": {
+            "English": "What do I do if the water is cloudy or dirty? cloudy muddy dirty murky brown water",
+            "Español": "¿Qué hago si el agua está turbia o sucia? turbia sucia lodosa cafe",
+        },
+        "answer": {
+            "English": "Let cloudy water sit so dirt sinks, pour the clear part through a clean cloth or coffee filter, then boil it for at least 3 minutes.",
+            "Español": "Deja reposar el agua turbia para que la tierra se asiente, pasa la parte clara por una tela limpia o un filtro de café y luego hiérvela por lo menos 3 minutos.",
+        },
+    },
+    {
+        "match": {
+            "English": "The water smells bad, what should I do? smell smells odor stinks bad rotten",
+            "Español": "El agua huele mal, ¿qué hago? huele olor apesta feo podrido",
+        },
+        "answer": {
+            "English": "A bad smell can mean sewage or chemicals. Don't drink it if you have another source. If you must, filter it through cloth or charcoal and boil it; if it smells of fuel or chemicals, boiling won't make it safe.",
+            "Español": "Un mal olor puede indicar aguas negras o químicos. No la bebas si tienes otra fuente. Si no hay otra opción, fíltrala con tela o carbón y hiérvela; si huele a combustible o químicos, hervirla no la hace segura.",
+        },
+    },
+    {
+        "match": {
+            "English": "Can I use bleach to make water safe? bleach chlorine drops tablets disinfect gallon liter",
+            "Español": "¿Puedo usar cloro para hacer el agua segura? cloro blanqueador gotas pastillas desinfectar galon litro",
+        },
+        "answer": {
+            "English": "Yes. Use plain, unscented household bleach: 2 drops per liter (8 drops per gallon), stir, and wait 30 minutes. Double it if the water is cloudy. Water purification tablets also work; follow the package directions.",
+            "Español": "Sí. Usa cloro de uso doméstico sin aroma: 2 gotas por litro (8 gotas por galón), mezcla y espera 30 minutos. Usa el doble si el agua está turbia. Las pastillas purificadoras también sirven; sigue las instrucciones del paquete.",
+        },
+    },
+    {
+        "match": {
+            "English": "Where can I find free drinking water nearby? find free drinking water fountain near",
+            "Español": "¿Dónde encuentro agua potable gratis cerca? encontrar gratis agua potable fuente bebedero cerca",
+        },
+        "answer": {
+            "English": "Use the \"Find Water Nearby\" map on this page to see public drinking fountains. Libraries, parks, shelters and community centers usually have free water too.",
+            "Español": "Usa el mapa \"Encontrar Agua Cercana\" en esta página para ver bebederos públicos. Las bibliotecas, parques, refugios y centros comunitarios normalmente también tienen agua gratis.",
+        },
+    },
+    {
+        "match": {
+            "English": "I feel sick after drinking water, what do I do? sick ill diarrhea vomiting stomach after drinking",
+            "Español": "Me siento mal después de beber agua, ¿qué hago? enfermo diarrea vomito estomago despues beber",
+        },
+        "answer": {
+            "English": "Drink small sips of safe water often to stay hydrated. Get medical help right away if you have a high fever, blood in stool, can't keep water down, or feel very weak or confused.",
+            "Español": "Toma sorbos pequeños de agua segura con frecuencia para mantenerte hidratado. Busca atención médica de inmediato si tienes fiebre alta, sangre en las heces, no puedes retener el agua o te sientes muy débil o confundido.",
+        },
+    },
+    {
+        "match": {
+            "English": "How much water should I drink in hot weather? hot heat weather how much drink dehydration thirsty",
+            "Español": "¿Cuánta agua debo tomar cuando hace calor? calor clima cuanta tomar deshidratacion sed",
+        },
+        "answer": {
+            "English": "In hot weather drink a cup of water every 15–20 minutes when you are active, even if you're not thirsty. Dark urine, dizziness and headache are signs you need more.",
+            "Español": "Cuando hace calor toma una taza de agua cada 15 a 20 minutos si estás activo, aunque no tengas sed. La orina oscura, el mareo y el dolor de cabeza son señales de que necesitas más.",
+        },
+    },
+]
+
+
+@dataclass(frozen=True)
+class Answer:
+    text: str
+    confidence: float
+
+
+def analyze(text):
+    """Tokenize and strip simple plural endings so "bottles"/"botellas" match "bottle"/"botella"."""
+    terms = []
+    for token in tokenize(text):
+        if token in QUESTION_WORDS:
+            continue
+        if len(token) > 4 and token.endswith("es"):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+@st.cache_resource(show_spinner=False)
+def build_index(language):
+    index = SearchIndex(analyzer=analyze)
+    for doc_id, entry in enumerate(GUIDE):
+        index.add(doc_id, entry["match"][language])
+    return index
+
+
+def lookup(question, language):
+    """Return a local Answer for `question`, or None if the guide has no confident match."""
+    index = build_index(language)
+    results = index.search(question, limit=1)
+    if not results:
+        return None
+    doc_id, _ = results[0]
+    terms = set(analyze(question))
+    matched = index.terms(doc_id)
+    total = sum(index.idf(term) for term in terms)
+    confidence = sum(index.idf(term) for term in terms if term in matched) / total if total else 0.0
+    if confidence < MIN_CONFIDENCE:
+        return None
+    return Answer(GUIDE[doc_id]["answer"][language], round(confidence, 2))
@@ -0,0 +1,287 @@
+"""Hot/cold tiering for water reports.
+
+Reports older than WATERWATCH_HOT_DAYS (default 90) are moved out of the
+worksheet into month-partitioned, zstd-compressed Parquet files under
+data/archive/reports/month=YYYY-MM/. A JSON manifest records each partition's
+time range and per-ZIP row counts, so reads skip every month outside the
+requested date range and every month with none of the requested ZIP codes
+without opening the files. Inside a file rows are sorted by ZIP code, so the
+remaining ZIP filter only touches the matching row groups.
+
+Archived rows keep the worksheet's text columns unchanged, so hot and cold
+rows can be concatenated directly.
+
+Archiving runs on a background thread (see `get_archiver`), never while a
+page renders. A run takes an exclusive lock in data/archive/runs.sqlite3, so
+only one process archives at a time and the hourly schedule is shared by all
+of them. It reads the sheet fresh and deletes only the archived rows, so
+reports added in the meantime are never overwritten.
+
+Rows are copied to the cold tier before they are deleted from the sheet. The
+manifest is the commit point: each write puts partitions in new files and
+lists the copied rows under "pending" (row hash -> count) until the deletion
+succeeds. Reads pass the live rows through `live_only`, which drops those
+still-pending copies, so a failed deletion never counts a report twice, and
+the next run finishes the deletion before archiving anything else.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from waterwatch.paths import data_path
+from waterwatch.reports import REPORT_COLUMNS, TIMESTAMP_FORMAT
+from waterwatch.sheets import get_replica
+
+logger = logging.getLogger(__name__)
+
+HOT_DAYS = int(os.environ.get("WATERWATCH_HOT_DAYS", "90"))
+RUN_EVERY_SECONDS = 3600
+ROW_GROUP_SIZE = 5000
+ARCHIVE_DIR = data_path("archive", "reports", "manifest.json").parent
+MANIFEST_PATH = ARCHIVE_DIR / "manifest.json"
+RUNS_PATH = data_path("archive", "runs.sqlite3")
+
+
+def _write_atomic(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def load_manifest():
+    """{"version": int, "partitions": {"YYYY-MM": {"file", "rows", "start", "end", "zipcodes"}}, "pending": {hash: count}}."""
+    if not MANIFEST_PATH.exists():
+        return {"version": 0, "partitions": {}, "pending": {}}
+    manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    manifest.setdefault("pending", {})
+    return manifest
+
+
+def _save_manifest(manifest):
+    manifest["version"] += 1
+    _write_atomic(MANIFEST_PATH, lambda tmp: tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8"))
+
+
+def _row_hashes(data):
+    """A hash of each report's fields, as strings (they key the manifest's "pending" counts)."""
+    fields = data.reindex(columns=REPORT_COLUMNS).fillna("").astype(str)
+    return pd.util.hash_pandas_object(fields, index=False).astype(str)
+
+
+def _pending_mask(data, pending):
+    """True for the rows of `data` that are copies of pending archived rows.
+
+    Identical reports are told apart by count: with n pending copies of a
+    hash, only the first n live rows with that hash match.
+    """
+    if not pending or data.empty:
+        return pd.Series(False, index=data.index)
+    hashes = _row_hashes(data)
+    return hashes.groupby(hashes).cumcount() < hashes.map(pending).fillna(0)
+
+
+def live_only(data, manifest=None):
+    """`data` (live rows) without rows already copied to the cold tier but not yet deleted from the sheet."""
+    pending = (manifest or load_manifest())["pending"]
+    return data[~_pending_mask(data, pending)] if pending else data
+
+
+def since(days, now=None):
+    """Timestamp string `days` days ago, for the `start` of a read."""
+    return ((now or datetime.now()) - timedelta(days=days)).strftime(TIMESTAMP_FORMAT)
+
+
+def _write_partition(month, rows, manifest):
+    """Write the month's rows plus `rows` to a new Parquet file and update its manifest entry.
+
+    The previous file stays in place until the manifest points at the new one,
+    so a run that dies before then leaves the archive as it was.
+    """
+    relative = f"month={month}/reports-{manifest['version'] + 1}.parquet"
+    path = data_path("archive", "reports", relative)
+    current = manifest["partitions"].get(month)
+    if current is not None:
+        rows = pd.concat([pd.read_parquet(ARCHIVE_DIR / current["file"]), rows], ignore_index=True)
+    rows = rows.fillna("").astype(str).sort_values(["zipcode", "timestamp"], ignore_index=True)
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    _write_atomic(path, lambda tmp: pq.write_table(
+        table, tmp, compression="zstd", row_group_size=ROW_GROUP_SIZE))
+    # Keep the file being replaced for readers still holding the old manifest; drop older ones.
+    keep = {path.name} | ({current["file"].split("/")[-1]} if current is not None else set())
+    for stale in path.parent.glob("*.parquet"):
+        if stale.name not in keep:
+            stale.unlink(missing_ok=True)
+    manifest["partitions"][month] = {
+        "file": relative,
+        "rows": len(rows),
+        "start": rows["timestamp"].min(),
+        "end": rows["timestamp"].max(),
+        "zipcodes": {str(k): int(v) for k, v in rows["zipcode"].value_counts().items()},
+    }
+
+
+def _old(data, now, hot_days):
+    timestamps = pd.to_datetime(data["timestamp"], format=TIMESTAMP_FORMAT, errors="coerce")
+    return timestamps, timestamps < pd.Timestamp(now or datetime.now()) - pd.Timedelta(days=hot_days)
+
+
+def archive_reports(data, now=None, hot_days=HOT_DAYS):
+    """Copy reports older than `hot_days` into the cold tier and return their index labels.
+
+    The archived rows are recorded as pending in the manifest; the caller
+    deletes them from the worksheet and then calls `confirm_deleted`.
+    """
+    timestamps, old = _old(data, now, hot_days)
+    if not old.any():
+        return data.index[:0]
+
+    cold = data[old].fillna("")
+    months = timestamps[old].dt.strftime("%Y-%m")
+    manifest = load_manifest()
+    for month, rows in cold.groupby(months):
+        _write_partition(month, rows, manifest)
+    manifest["pending"] = {key: int(count) for key, count in _row_hashes(cold).value_counts().items()}
+    _save_manifest(manifest)
+    return data.index[old]
+
+
+def pending_rows(data, now=None, hot_days=HOT_DAYS):
+    """Index labels of the old rows in `data` that are already archived but still pending deletion."""
+    pending = load_manifest()["pending"]
+    if not pending:
+        return data.index[:0]
+    _, old = _old(data, now, hot_days)
+    old_rows = data[old]
+    return old_rows.index[_pending_mask(old_rows, pending)]
+
+
+def confirm_deleted():
+    """Record that the pending archived rows are gone from the worksheet."""
+    manifest = load_manifest()
+    if manifest["pending"]:
+        manifest["pending"] = {}
+        _save_manifest(manifest)
+
+
+def run_due(replica, interval=RUN_EVERY_SECONDS):
+    """Archive the replica's worksheet unless any process has in the last `interval` seconds.
+
+    Returns the number of reports archived; 0 if another process holds the
+    lock or ran recently.
+    """
+    with closing(sqlite3.connect(RUNS_PATH, timeout=0, isolation_level=None)) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY CHECK (id = 1), finished_at REAL NOT NULL)")
+        try:
+            # Held until COMMIT; other processes fail straight away instead of waiting.
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return 0
+        try:
+            row = conn.execute("SELECT finished_at FROM runs WHERE id = 1").fetchone()
+            if row and time.time() - row[0] < interval:
+                return 0
+            # Recorded up front so a failing run is retried next interval, not on every wake-up.
+            conn.execute("INSERT OR REPLACE INTO runs (id, finished_at) VALUES (1, ?)", (time.time(),))
+            # A fresh read, not the snapshot, so rows added since the last poll are seen.
+            data = replica.read_all()
+            if data.empty or "timestamp" not in data.columns:
+                return 0
+            # Finish an earlier run whose deletion failed: those rows are archived already.
+            leftover = pending_rows(data)
+            if len(leftover):
+                replica.delete_rows(leftover)
+                logger.info("Deleted %d reports archived by an earlier run", len(leftover))
+                data = replica.read_all()
+            confirm_deleted()
+            positions = archive_reports(data)
+            if len(positions):
+                replica.delete_rows(positions)
+                confirm_deleted()
+                logger.info("Archived %d reports older than %d days", len(positions), HOT_DAYS)
+            return len(positions)
+        finally:
+            conn.execute("COMMIT")
+
+
+class Archiver:
+    """Runs `run_due` for one worksheet on a background thread."""
+
+    def __init__(self, replica, interval=RUN_EVERY_SECONDS):
+        self.replica = replica
+        self.interval = interval
+        self._thread = threading.Thread(target=self._run, name="waterwatch-archive", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                run_due(self.replica, self.interval)
+            except Exception:
+                logger.exception("Archiving reports failed; leaving them in the worksheet")
+            # Wake up often enough to take over soon after another process's run is due.
+            time.sleep(min(self.interval, 300))
+
+
+@st.cache_resource(show_spinner=False)
+def get_archiver(worksheet):
+    """Start archiving `worksheet` in the background, once per process."""
+    return Archiver(get_replica(worksheet))
+
+
+def partitions(start=None, end=None, zipcodes=None, manifest=None):
+    """Manifest entries whose month overlaps [start, end] and holds any of `zipcodes`."""
+    manifest = manifest or load_manifest()
+    wanted = set(zipcodes) if zipcodes is not None else None
+    selected = []
+    for month, entry in sorted(manifest["partitions"].items()):
+        if start and entry["end"] < start:
+            continue
+        if end and entry["start"] > end:
+            continue
+        if wanted is not None and wanted.isdisjoint(entry["zipcodes"]):
+            continue
+        selected.append(entry)
+    return selected
+
+
+def read_archive(start=None, end=None, zipcodes=None, columns=None):
+    """Archived reports between `start` and `end` (timestamp strings) for `zipcodes`.
+
+    Only the partitions that can contain matching rows are opened, and only
+    the requested columns and matching row groups are read from them.
+    """
+    filters = []
+    if start:
+        filters.append(("timestamp", ">=", start))
+    if end:
+        filters.append(("timestamp", "<=", end))
+    if zipcodes is not None:
+        filters.append(("zipcode", "in", list(zipcodes)))
+
+    frames = [
+        pq.read_table(ARCHIVE_DIR / entry["file"], columns=columns, filters=filters or None).to_pandas()
+        for entry in partitions(start, end, zipcodes)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=columns) if columns else pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def zipcode_counts(manifest=None):
+    """Archived report counts per ZIP code, from the manifest alone."""
+    manifest = manifest or load_manifest()
+    counts = {}
+    for entry in manifest["partitions"].values():
+        for zipcode, rows in entry["zipcodes"].items():
+            counts[zipcode] = counts.get(zipcode, 0) + rows
+    return pd.Series(counts, dtype="int64")
@@ -0,0 +1,93 @@
+"""Local image assets, resized once per process and served from memory.
+
+The logo used to be hot-linked from raw.githubusercontent.com at full size
+(1024x1024, ~1.7 MB) on every page. Here it is read from the repo, resized to
+the widths we actually display and re-encoded as WebP and PNG.
+"""
+import logging
+from io import BytesIO
+from pathlib import Path
+
+import streamlit as st
+from PIL import Image
+
+from waterwatch import lite
+from waterwatch.httpclient import UpstreamUnavailable, get_bytes
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+LOGO_PATH = ROOT / "waterwatchlogov2.png"
+
+SIDEBAR_WIDTH = 300
+BANNER_WIDTH = 500
+LOGO_WIDTHS = (SIDEBAR_WIDTH, BANNER_WIDTH)
+
+HERO_URL = "https://images.unsplash.com/photo-1589927986089-35812388d1b4"
+HERO_WIDTH = 600
+
+
+def resize_to_width(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == "webp":
+        image.save(buffer, format="WEBP", quality=85, method=6)
+    elif fmt == "png":
+        # A 256-colour palette keeps the alpha channel and is a fraction of the RGBA size.
+        image.quantize(colors=256, method=Image.FASTOCTREE).save(buffer, format="PNG", optimize=True)
+    else:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    return buffer.getvalue()
+
+
+@st.cache_resource(show_spinner=False)
+def logo_variants():
+    """All `(width, format) -> bytes` logo variants, built on first use."""
+    with Image.open(LOGO_PATH) as source:
+        source = source.convert("RGBA")
+        variants = {}
+        for width in LOGO_WIDTHS:
+            resized = resize_to_width(source, width)
+            for fmt in ("webp", "png"):
+                variants[(width, fmt)] = encode(resized, fmt)
+    return variants
+
+
+def logo(width=SIDEBAR_WIDTH, fmt="webp"):
+    return logo_variants()[(width, fmt)]
+
+
+def sidebar_logo():
+    if lite.enabled():
+        return
+    with st.sidebar:
+        st.image(logo(SIDEBAR_WIDTH), width=SIDEBAR_WIDTH)
+
+
+@st.cache_resource(show_spinner=False)
+def _hero_variant(width):
+    raw, _ = get_bytes("images", HERO_URL, {"w": width * 2, "fm": "jpg"})
+    try:
+        with Image.open(BytesIO(raw)) as source:
+            return encode(resize_to_width(source.convert("RGB"), width), "webp")
+    except (OSError, Image.DecompressionBombError) as e:
+        # UnidentifiedImageError and truncated downloads are both OSErrors. Cache
+        # the miss so a bad payload isn't downloaded again on every rerun.
+        logger.warning("Hero image could not be decoded (%s); using the logo", e)
+        return None
+
+
+def hero_image(width=HERO_WIDTH):
+    """The help-center photo, downloaded once per process and shrunk to `width`.
+
+    Falls back to the bundled logo if the photo can't be fetched or decoded.
+    """
+    try:
+        variant = _hero_variant(width)
+    except UpstreamUnavailable:
+        variant = None
+    return variant or logo(BANNER_WIDTH)
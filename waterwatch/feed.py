@@ -0,0 +1,202 @@
+"""Prebuilt feed of active bulletin alerts for partner organizations.
+
+The feed is rendered as JSON, iCalendar and plain text and written under
+static/feed/, which Streamlit serves at /app/static/feed/ when
+server.enableStaticServing is on. Polling them never touches the sheet, and
+the JSON document carries an `etag` that only changes with the alerts, so
+partners can tell when there is nothing new.
+
+Files are only rewritten when the set of active alerts changes: when the
+alerts snapshot version changes, or when the next alert expires (a timer
+handles that even if nobody opens the bulletin).
+"""
+import ast
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import pandas as pd
+import streamlit as st
+
+from waterwatch.alerts import LANGUAGES, MESSAGE_COLUMNS, alert_message, canonical_type
+from waterwatch.paths import ROOT
+
+FEED_DIR = ROOT / "static" / "feed"
+FILENAMES = {"json": "alerts.json", "ics": "alerts.ics", "txt": "alerts.txt"}
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+FIELDS = ["timestamp", "type", "message", "location_name", "address", "coordinates", "hours", "expiration_time"]
+COLUMNS = FIELDS + list(MESSAGE_COLUMNS.values())
+
+
+@dataclass(frozen=True)
+class Feed:
+    etag: str
+    generated_at: str
+    alerts: list
+    files: dict = field(repr=False)
+    next_expiry: datetime = None
+
+
+def _clean(value):
+    return "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+
+
+def _coordinates(value):
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = ast.literal_eval(value) if value else None
+    except (ValueError, SyntaxError):
+        return None
+    return parsed if isinstance(parsed, dict) and "lat" in parsed and "lng" in parsed else None
+
+
+def active_alerts(alerts, now=None):
+    """Alerts that haven't expired yet, oldest first, as plain dicts."""
+    if alerts.empty or not {"timestamp", "expiration_time"} <= set(alerts.columns):
+        return []
+    now = now or datetime.now()
+    expires = pd.to_datetime(alerts["expiration_time"], format=TIME_FORMAT, errors="coerce")
+    # Rows with a blank or malformed timestamp are skipped rather than breaking the whole feed.
+    posted = pd.to_datetime(alerts["timestamp"], format=TIME_FORMAT, errors="coerce")
+    active = alerts[(expires > now) & posted.notna()].reindex(columns=COLUMNS)
+    records = []
+    for values in active.itertuples(index=False, name=None):
+        row = {name: _clean(value) for name, value in zip(COLUMNS, values)}
+        record = {name: row[name] for name in FIELDS}
+        # `message` stays English for existing consumers; `messages` has every language.
+        record["messages"] = {language: alert_message(row, language) for language in LANGUAGES}
+        record["message"] = record["messages"]["English"]
+        record["type"] = canonical_type(record["type"])
+        record["coordinates"] = _coordinates(record["coordinates"])
+        record["id"] = hashlib.sha1(f"{record['timestamp']}|{record['location_name']}|{record['address']}".encode()).hexdigest()[:16]
+        records.append(record)
+    return sorted(records, key=lambda record: record["timestamp"])
+
+
+def _ics_escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_fold(line):
+    # RFC 5545: lines longer than 75 octets continue on lines starting with a space.
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts, current = [], b""
+    for char in line:
+        piece = char.encode("utf-8")
+        if len(current) + len(piece) > (75 if not parts else 74):
+            parts.append(current.decode("utf-8"))
+            current = b""
+        current += piece
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def _ics_time(text):
+    return datetime.strptime(text, TIME_FORMAT).strftime("%Y%m%dT%H%M%S")
+
+
+def render_ics(records, generated):
+    stamp = generated.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//WaterWatch//Community Bulletin//EN", "CALSCALE:GREGORIAN"]
+    for record in records:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{record['id']}@waterwatch",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{_ics_time(record['timestamp'])}",
+            f"DTEND:{_ics_time(record['expiration_time'])}",
+            f"SUMMARY:{_ics_escape(record['type'] + ': ' + record['location_name'])}",
+            f"LOCATION:{_ics_escape(record['address'])}",
+            f"DESCRIPTION:{_ics_escape(_bilingual(record) + ' (' + record['hours'] + ')')}",
+        ]
+        if record["coordinates"]:
+            lines.append(f"GEO:{record['coordinates']['lat']};{record['coordinates']['lng']}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_ics_fold(line) for line in lines) + "\r\n").encode("utf-8")
+
+
+def _bilingual(record):
+    return "\n".join(dict.fromkeys(record["messages"].values()))
+
+
+def render_text(records):
+    return "\n\n".join(_bilingual(record) for record in records).encode("utf-8")
+
+
+def build_feed(alerts, now=None):
+    now = now or datetime.now()
+    records = active_alerts(alerts, now)
+    etag = hashlib.sha256(json.dumps(records, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:20]
+    generated = now.astimezone()
+    document = {"etag": etag, "generated_at": generated.isoformat(timespec="seconds"), "alerts": records}
+    files = {
+        "json": json.dumps(document, ensure_ascii=False, indent=1).encode("utf-8"),
+        "ics": render_ics(records, generated),
+        "txt": render_text(records),
+    }
+    expiries = [datetime.strptime(record["expiration_time"], TIME_FORMAT) for record in records]
+    return Feed(etag, document["generated_at"], records, files, min(expiries) if expiries else None)
+
+
+class FeedPublisher:
+    def __init__(self, directory=FEED_DIR):
+        self.directory = directory
+        self.feed = None
+        self._version = None
+        self._alerts = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def refresh(self, alerts, version):
+        """Return the current feed, rebuilding and republishing it only if it may have changed."""
+        with self._lock:
+            now = datetime.now()
+            expired = self.feed is not None and self.feed.next_expiry is not None and now >= self.feed.next_expiry
+            if self.feed is None or version != self._version or expired:
+                self._version = version
+                self._alerts = alerts
+                self._rebuild(now)
+            return self.feed
+
+    def _rebuild(self, now):
+        feed = build_feed(self._alerts, now)
+        if self.feed is None or feed.etag != self.feed.etag:
+            self._write(feed)
+        self.feed = feed
+        self._schedule(feed.next_expiry)
+
+    def _write(self, feed):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for fmt, filename in FILENAMES.items():
+            path = self.directory / filename
+            temporary = path.with_suffix(path.suffix + ".tmp")
+            temporary.write_bytes(feed.files[fmt])
+            os.replace(temporary, path)
+
+    def _schedule(self, when):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if when is None:
+            return
+        delay = max(1.0, (when - datetime.now()).total_seconds() + 1)
+        self._timer = threading.Timer(delay, self._on_expiry)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_expiry(self):
+        with self._lock:
+            if self._alerts is not None:
+                self._rebuild(datetime.now())
+
+
+@st.cache_resource(show_spinner=False)
+def get_publisher():
+    return FeedPublisher()
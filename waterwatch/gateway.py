@@ -0,0 +1,168 @@
+"""Process-wide gateway for outbound API calls.
+
+Streamlit runs every session in the same process, so module-level state here
+is shared by all of them. Identical in-flight requests are merged into a
+single upstream call (single-flight) and every provider gets a token-bucket
+rate limit so bursts of traffic don't get us throttled. Each provider also
+has a default timeout: how long a caller waits for a token, or for somebody
+else's in-flight call, before giving up.
+"""
+import threading
+import time
+
+# Requests per second, burst size and wait timeout (seconds) for each provider we call.
+PROVIDER_LIMITS = {
+    "overpass": {"rate": 0.5, "burst": 2, "timeout": 60},
+    "opencage": {"rate": 1.0, "burst": 1, "timeout": 15},
+    "openai": {"rate": 3.0, "burst": 5, "timeout": 60},
+    "images": {"rate": 1.0, "burst": 2, "timeout": 30},
+}
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """Wait for a token. Returns False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class RateLimited(Exception):
+    """Raised when a provider's token bucket can't serve a call in time."""
+
+
+class InFlightFailed(Exception):
+    """The in-flight call this caller was waiting on failed; the leader's error is the __cause__."""
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Gateway:
+    def __init__(self, limits=None):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._timeouts = {}
+        self._inflight = {}
+        self._stats = {}
+        for provider, limit in (limits or PROVIDER_LIMITS).items():
+            self.configure(provider, **limit)
+
+    def configure(self, provider, rate, burst, timeout=None):
+        with self._lock:
+            self._buckets[provider] = TokenBucket(rate, burst)
+            self._timeouts[provider] = timeout
+            self._stats.setdefault(provider, {
+                "calls": 0,          # upstream calls actually made
+                "coalesced": 0,      # callers served by someone else's call
+                "errors": 0,
+                "queue_depth": 0,    # callers currently waiting for a token
+                "max_queue_depth": 0,
+                "waiting": 0,        # callers currently waiting on an in-flight call
+                "throttle_wait_s": 0.0,
+            })
+
+    def timeout(self, provider):
+        """The provider's default wait timeout in seconds (None waits forever)."""
+        return self._timeouts.get(provider)
+
+    def call(self, provider, key, fn, timeout=None):
+        """Run `fn()` for `(provider, key)`, sharing the result with concurrent callers.
+
+        Only one caller per key reaches the provider; everyone else who asks
+        for the same key while it is in flight waits for that result. Waits
+        longer than `timeout` (default: the provider's) raise RateLimited for
+        the caller making the call and TimeoutError for those waiting on it.
+        """
+        if timeout is None:
+            timeout = self.timeout(provider)
+        flight_key = (provider, key)
+        with self._lock:
+            stats = self._stats[provider]
+            flight = self._inflight.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[flight_key] = _InFlight()
+            else:
+                stats["coalesced"] += 1
+                stats["waiting"] += 1
+
+        if not leader:
+            try:
+                flight.done.wait(timeout)
+            finally:
+                with self._lock:
+                    stats["waiting"] -= 1
+            if not flight.done.is_set():
+                raise TimeoutError(f"Timed out waiting for in-flight {provider} call")
+            if flight.error is not None:
+                # A fresh exception per follower; the shared one's traceback is the leader's.
+                raise InFlightFailed(f"In-flight {provider} call failed: {flight.error}") from flight.error
+            return flight.result
+
+        try:
+            self._wait_for_token(provider, timeout)
+            with self._lock:
+                stats["calls"] += 1
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+            flight.done.set()
+
+    def _wait_for_token(self, provider, timeout):
+        stats = self._stats[provider]
+        with self._lock:
+            stats["queue_depth"] += 1
+            stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+        started = time.monotonic()
+        try:
+            if not self._buckets[provider].acquire(timeout):
+                raise RateLimited(f"{provider} rate limit: no token within {timeout}s")
+        finally:
+            with self._lock:
+                stats["queue_depth"] -= 1
+                stats["throttle_wait_s"] += time.monotonic() - started
+
+    def metrics(self):
+        """Snapshot of per-provider counters, e.g. for an admin view or logs."""
+        with self._lock:
+            return {provider: dict(stats) for provider, stats in self._stats.items()}
+
+
+gateway = Gateway()
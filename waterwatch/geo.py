@@ -0,0 +1,20 @@
+"""Geocoding and water-source lookups over the shared HTTP client."""
+from waterwatch.httpclient import get_json
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+
+
+def geocode(address, api_key):
+    """Return OpenCage's best `{"lat": ..., "lng": ...}` match for `address`, or None."""
+    query = " ".join(address.split())
+    data, _ = get_json("opencage", OPENCAGE_URL, {"q": query, "key": api_key}, flight_key=query.lower())
+    if data["results"]:
+        return data["results"][0]["geometry"]
+    return None
+
+
+def overpass_elements(query):
+    """Run an Overpass QL query. Returns `(elements, stale)`, see `get_json`."""
+    data, stale = get_json("overpass", OVERPASS_URL, {"data": query})
+    return data.get("elements", []), stale
@@ -0,0 +1,120 @@
+"""ZIP-level density and severity layer for water reports.
+
+Reports are scored and grouped by 5-digit ZIP in one vectorized pass, then
+placed on the map at the ZIP's centroid, which means the layer costs one row
+per ZIP however many reports there are.
+
+Centroids come from OpenCage once per ZIP and are kept in
+data/zip_centroids.json (misses included, so unknown ZIPs are not looked up
+again). Building a layer only uses the centroids already saved; new ZIPs are
+geocoded by `fill_centroids`, which the page runs as a background job because
+the gateway allows one OpenCage request a second.
+"""
+import json
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from waterwatch.geo import geocode
+from waterwatch.paths import data_path
+
+logger = logging.getLogger(__name__)
+
+CENTROIDS_PATH = data_path("zip_centroids.json")
+MAX_LOOKUPS = 25  # new ZIPs geocoded per fill; the rest are picked up by later fills
+
+# How alarming each concern is, on top of the base weight of 1 per report
+CONCERN_WEIGHTS = {
+    "Discoloration": 1.0,
+    "Foul smell": 1.0,
+    "Foam on surface": 1.5,
+    "Bugs or larvae": 2.0,
+    "Near industrial area": 1.5,
+    "Trash nearby": 0.5,
+    "Other": 0.5,
+}
+USED_WEIGHT = 1.5            # somebody used the water
+USED_WITH_SYMPTOMS_WEIGHT = 3.0  # ...and reported symptoms afterwards
+NO_SYMPTOMS = ["", "n/a", "na", "none", "no", "nan"]
+
+LAYER_COLUMNS = ["zipcode", "lat", "lon", "reports", "severity"]
+
+_lock = threading.Lock()
+
+
+def report_severity(data):
+    """Severity weight of every report, computed column-wise."""
+    concerns = data["concerns"].fillna("").astype(str).str.replace(r"\s*,\s*", ",", regex=True).str.get_dummies(sep=",")
+    weights = pd.Series(CONCERN_WEIGHTS).reindex(concerns.columns, fill_value=CONCERN_WEIGHTS["Other"])
+    concern_score = concerns.to_numpy(dtype="float32") @ weights.to_numpy(dtype="float32")
+
+    used = data["used"].fillna("").astype(str).str.strip().eq("Yes").to_numpy()
+    symptoms = ~data["symptoms"].fillna("").astype(str).str.strip().str.lower().isin(NO_SYMPTOMS).to_numpy()
+    factor = np.where(used, np.where(symptoms, USED_WITH_SYMPTOMS_WEIGHT, USED_WEIGHT), 1.0)
+    return (1.0 + concern_score) * factor
+
+
+def zip_cells(data):
+    """One row per 5-digit ZIP with its report count and summed severity."""
+    if data.empty:
+        return pd.DataFrame(columns=["zipcode", "reports", "severity"])
+    frame = pd.DataFrame({
+        "zipcode": data["zipcode"].astype(str).str.strip().str[:5],
+        "severity": report_severity(data),
+    })
+    frame = frame[frame["zipcode"].str.fullmatch(r"\d{5}")]
+    return frame.groupby("zipcode", as_index=False).agg(reports=("severity", "size"), severity=("severity", "sum"))
+
+
+def _load_centroids():
+    if CENTROIDS_PATH.exists():
+        return json.loads(CENTROIDS_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+def centroids_version():
+    """Changes whenever new centroids are saved, for keying cached layers."""
+    return CENTROIDS_PATH.stat().st_mtime_ns if CENTROIDS_PATH.exists() else 0
+
+
+def fill_centroids(zipcodes, api_key, max_lookups=MAX_LOOKUPS):
+    """Geocode and save up to `max_lookups` of `zipcodes` not looked up before; returns how many were saved."""
+    with _lock:
+        centroids = _load_centroids()
+        saved = 0
+        for zipcode in [z for z in zipcodes if z not in centroids][:max_lookups]:
+            try:
+                point = geocode(f"{zipcode}, USA", api_key)
+            except Exception:
+                logger.warning("Could not geocode ZIP %s", zipcode, exc_info=True)
+                continue
+            centroids[zipcode] = [point["lat"], point["lng"]] if point else None
+            saved += 1
+        if saved:
+            tmp = CENTROIDS_PATH.with_suffix(".tmp")
+            tmp.write_text(json.dumps(centroids), encoding="utf-8")
+            tmp.replace(CENTROIDS_PATH)
+    return saved
+
+
+def build_layer(data):
+    """Compact heatmap layer from the saved centroids, and the ZIP codes that have none yet.
+
+    The layer has columns zipcode, lat, lon, reports, severity (float32).
+    """
+    cells = zip_cells(data)
+    centroids = _load_centroids()
+    missing = [z for z in cells["zipcode"] if z not in centroids]
+    points = cells["zipcode"].map(centroids)
+    cells = cells[points.notna()]
+    coords = np.array(points.dropna().tolist(), dtype="float32").reshape(-1, 2)
+    layer = pd.DataFrame({
+        "zipcode": cells["zipcode"].to_numpy(),
+        "lat": coords[:, 0],
+        "lon": coords[:, 1],
+        "reports": cells["reports"].to_numpy(dtype="int32"),
+        "severity": cells["severity"].to_numpy(dtype="float32").round(1),
+    }, columns=LAYER_COLUMNS)
+    return layer, missing
@@ -0,0 +1,181 @@
+"""Shared HTTP client for upstream JSON APIs.
+
+One keep-alive session pool for the whole process, per-provider timeouts, a
+circuit breaker per provider and a last-good-response cache. When a provider
+is failing we answer from the cache straight away instead of tying up a
+script thread on a hung connection.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from waterwatch.gateway import InFlightFailed, RateLimited, gateway
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds.
+PROVIDER_TIMEOUTS = {
+    "overpass": (3.05, 25),
+    "opencage": (3.05, 5),
+    "images": (3.05, 15),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+BREAKER_FAILURES = 3        # consecutive failures before the breaker opens
+BREAKER_RESET_SECONDS = 30  # how long it stays open before letting a probe through
+STALE_CACHE_SIZE = 256
+
+
+class UpstreamUnavailable(Exception):
+    """The provider failed and there is no earlier response to fall back on."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._count = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a request may go upstream. Lets a single probe through once the reset time passes."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self):
+        """Forget a call that ended without an upstream outcome, freeing the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._count += 1
+            self._probing = False
+            if self._count >= self.failures:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            return "closed" if self._opened_at is None else "open"
+
+
+def _build_session():
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = _build_session()
+_breakers = {}
+_last_good = OrderedDict()
+_lock = threading.Lock()
+
+
+def breaker_for(provider):
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker()
+        return _breakers[provider]
+
+
+def _remember(key, data):
+    with _lock:
+        _last_good[key] = data
+        _last_good.move_to_end(key)
+        while len(_last_good) > STALE_CACHE_SIZE:
+            _last_good.popitem(last=False)
+
+
+def _stale(key):
+    with _lock:
+        return _last_good.get(key)
+
+
+def get_json(provider, url, params=None, flight_key=None):
+    """GET `url` and decode JSON. Returns `(data, stale)`.
+
+    `stale` is True when the provider failed (or its breaker is open) and the
+    last good response for the same request was returned instead. Raises
+    UpstreamUnavailable if there is nothing to fall back on.
+    """
+    return _get(provider, url, params, flight_key, decode=lambda response: response.json())
+
+
+def get_bytes(provider, url, params=None):
+    """Like `get_json` but returns the raw response body."""
+    return _get(provider, url, params, None, decode=lambda response: response.content)
+
+
+def _get(provider, url, params, flight_key, decode):
+    params = params or {}
+    cache_key = (provider, url, tuple(sorted(params.items())))
+    breaker = breaker_for(provider)
+
+    if breaker.allow():
+        try:
+            data = gateway.call(
+                provider,
+                flight_key if flight_key is not None else cache_key,
+                lambda: _fetch(provider, url, params, decode),
+                timeout=gateway.timeout(provider),
+            )
+        except RateLimited as e:
+            # Our own throttling, not an upstream failure: don't trip the breaker.
+            breaker.release()
+            logger.warning("%s request not sent (%s)", provider, e)
+        except (InFlightFailed, TimeoutError) as e:
+            # We were waiting on someone else's call. If it was throttled that's
+            # not an upstream failure, and if it failed upstream its caller has
+            # already counted it once; counting it again per waiter would let
+            # one bad call trip the breaker.
+            breaker.release()
+            if isinstance(e.__cause__, RateLimited):
+                logger.warning("%s request not sent (%s)", provider, e.__cause__)
+            else:
+                logger.warning("%s shared request failed (%s), breaker %s", provider, e, breaker.state)
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning("%s request failed (%s), breaker %s", provider, e, breaker.state)
+        else:
+            breaker.record_success()
+            _remember(cache_key, data)
+            return data, False
+
+    data = _stale(cache_key)
+    if data is None:
+        raise UpstreamUnavailable(f"{provider} is unavailable and no earlier response is cached")
+    return data, True
+
+
+def _fetch(provider, url, params, decode):
+    response = _session.get(url, params=params, timeout=PROVIDER_TIMEOUTS.get(provider, DEFAULT_TIMEOUT))
+    response.raise_for_status()
+    return decode(response)
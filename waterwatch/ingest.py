@@ -0,0 +1,100 @@
+"""Bulk import of water reports from CSV or JSONL.
+
+Files are streamed in chunks and every rule is checked column-wise over the
+whole chunk, so validation cost is a handful of vectorized passes rather than
+one Python call per row.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from waterwatch.reports import (
+    CONCERN_OPTIONS,
+    REPORT_COLUMNS,
+    REQUIRED_FIELDS,
+    SOURCE_TYPES,
+    TIMESTAMP_FORMAT,
+    USED_OPTIONS,
+    ZIP_PATTERN,
+)
+
+CHUNK_ROWS = 20_000
+MAX_ERRORS = 10_000
+
+
+def read_chunks(file, filename, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrame chunks of text columns from an uploaded CSV or JSONL file."""
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        for chunk in pd.read_json(file, lines=True, chunksize=chunk_rows, dtype=False):
+            yield chunk.astype(str).where(chunk.notna(), "")
+    else:
+        try:
+            chunks = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+        except pd.errors.EmptyDataError:
+            # A zero-byte file has no header to parse: treat it as an upload with no reports.
+            return
+        yield from chunks
+
+
+def _errors(mask, rows, field, message):
+    return pd.DataFrame({"row": rows[mask], "field": field, "error": message})
+
+
+def validate_chunk(chunk, first_row=1):
+    """Split a chunk into `(valid_reports, errors)`.
+
+    `errors` has one line per failed check with the 1-based data row number
+    (counting from `first_row`), the field and a message.
+    """
+    data = chunk.reindex(columns=REPORT_COLUMNS).fillna("").astype(str).apply(lambda column: column.str.strip())
+    rows = pd.Series(range(first_row, first_row + len(data)), index=data.index)
+    problems = []
+
+    for field in REQUIRED_FIELDS:
+        problems.append(_errors(data[field] == "", rows, field, "required"))
+
+    has_zip = data["zipcode"] != ""
+    problems.append(_errors(has_zip & ~data["zipcode"].str.fullmatch(ZIP_PATTERN), rows, "zipcode",
+                            "must look like 12345 or 12345-6789"))
+    has_type = data["type"] != ""
+    problems.append(_errors(has_type & ~data["type"].isin(SOURCE_TYPES), rows, "type",
+                            "must be one of: " + ", ".join(SOURCE_TYPES)))
+    has_used = data["used"] != ""
+    problems.append(_errors(has_used & ~data["used"].isin(USED_OPTIONS), rows, "used", "must be Yes or No"))
+
+    # Concerns: split every row at once and check each value against the form's options.
+    concerns = data["concerns"].str.split(",").explode().str.strip()
+    concerns = concerns[concerns != ""]
+    unknown = concerns[~concerns.isin(CONCERN_OPTIONS)]
+    if not unknown.empty:
+        bad = unknown.groupby(level=0).agg(", ".join)
+        problems.append(pd.DataFrame({"row": rows[bad.index], "field": "concerns", "error": "unknown: " + bad}))
+    data["concerns"] = concerns.groupby(level=0).agg(", ".join).reindex(data.index, fill_value="")
+
+    # Timestamps are optional; missing ones are stamped with the import time.
+    has_time = data["timestamp"] != ""
+    parsed = pd.to_datetime(data["timestamp"].where(has_time), errors="coerce", format="mixed")
+    problems.append(_errors(has_time & parsed.isna(), rows, "timestamp", "not a date/time"))
+    data["timestamp"] = parsed.dt.strftime(TIMESTAMP_FORMAT).where(has_time, datetime.now().strftime(TIMESTAMP_FORMAT))
+
+    data["symptoms"] = data["symptoms"].mask(data["symptoms"] == "", "N/A")
+
+    errors = pd.concat(problems, ignore_index=True)
+    valid = data[~rows.isin(errors["row"])]
+    return valid, errors
+
+
+def validate_file(file, filename):
+    """Validate a whole upload. Returns `(valid_reports, errors, total_rows)`."""
+    valid_parts, error_parts, total = [], [], 0
+    error_count = 0
+    for chunk in read_chunks(file, filename):
+        valid, errors = validate_chunk(chunk, first_row=total + 1)
+        total += len(chunk)
+        valid_parts.append(valid)
+        if error_count < MAX_ERRORS:
+            error_parts.append(errors.head(MAX_ERRORS - error_count))
+            error_count += len(error_parts[-1])
+    valid = pd.concat(valid_parts, ignore_index=True) if valid_parts else pd.DataFrame(columns=REPORT_COLUMNS)
+    errors = pd.concat(error_parts, ignore_index=True) if error_parts else pd.DataFrame(columns=["row", "field", "error"])
+    return valid, errors.sort_values(["row", "field"], kind="stable"), total
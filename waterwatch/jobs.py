@@ -0,0 +1,203 @@
+"""Background jobs for heavy analytics and exports.
+
+CPU-bound work (groupbys, chart rendering, CSV encoding) runs in a small
+process pool so it never holds the server process's GIL. Work that mostly
+waits on the network (AI summaries) runs in a thread pool, where it keeps
+sharing the process's gateway and usage ledger. Both lanes share one bounded
+queue: when MAX_PENDING jobs are waiting or running, `submit` raises
+QueueFull instead of letting analysts pile up work in front of everyone else.
+
+Jobs are identified by an id; jobs submitted with the same `key` share one
+run, and finished results stay cached (newest RESULT_CACHE_SIZE) so
+re-opening a chart or export is free. Inside a job, `report_progress` updates
+the progress bar shown by `wait`, which also draws the finished job's result.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+PROCESS_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+THREAD_WORKERS = 4
+MAX_PENDING = 16
+RESULT_CACHE_SIZE = 64
+POLL_EVERY = "1s"
+
+_current = threading.local()
+_worker_queue = None
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    key: object
+    status: str = "queued"  # queued, running, done, failed
+    progress: float = 0.0
+    message: str = ""
+    result: object = field(default=None, repr=False)
+    error: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+
+def report_progress(fraction, message=""):
+    """Update the running job's progress (0-1). Does nothing outside a job."""
+    sink = getattr(_current, "sink", None)
+    if sink is not None:
+        sink(_current.job_id, fraction, message)
+
+
+def _init_worker(progress_queue):
+    global _worker_queue
+    _worker_queue = progress_queue
+
+
+def _run_in_process(job_id, fn, args, kwargs):
+    _current.job_id = job_id
+    _current.sink = lambda *update: _worker_queue.put(update)
+    report_progress(0.0)
+    return fn(*args, **kwargs)
+
+
+class JobManager:
+    def __init__(self, process_workers=PROCESS_WORKERS, thread_workers=THREAD_WORKERS, max_pending=MAX_PENDING):
+        # Spawned workers don't inherit the server's threads, locks or open sockets.
+        context = multiprocessing.get_context("spawn")
+        self._progress = context.Queue()
+        self._processes = ProcessPoolExecutor(process_workers, mp_context=context,
+                                              initializer=_init_worker, initargs=(self._progress,))
+        self._threads = ThreadPoolExecutor(thread_workers, thread_name_prefix="waterwatch-job")
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._by_key = OrderedDict()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._listen, name="waterwatch-job-progress", daemon=True).start()
+
+    def submit(self, kind, fn, *args, key=None, lane="process", **kwargs):
+        """Queue `fn(*args, **kwargs)` and return its job id.
+
+        `lane="process"` needs `fn` and its arguments to be picklable
+        (module-level functions); `lane="thread"` runs it in this process.
+        """
+        with self._lock:
+            if key is not None and key in self._by_key:
+                existing = self._jobs[self._by_key[key]]
+                if existing.status != "failed":
+                    self._by_key.move_to_end(key)
+                    return existing.id
+            if sum(not job.done for job in self._jobs.values()) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs are already waiting")
+            job = Job(uuid.uuid4().hex[:12], kind, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+            self._evict()
+
+        if lane == "thread":
+            future = self._threads.submit(self._run_in_thread, job.id, fn, args, kwargs)
+        else:
+            future = self._processes.submit(_run_in_process, job.id, fn, args, kwargs)
+        future.add_done_callback(lambda future: self._finish(job.id, future))
+        return job.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def metrics(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    def _run_in_thread(self, job_id, fn, args, kwargs):
+        _current.job_id = job_id
+        _current.sink = self._update
+        try:
+            report_progress(0.0)
+            return fn(*args, **kwargs)
+        finally:
+            _current.sink = None
+
+    def _update(self, job_id, fraction, message=""):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.done:
+                job.status = "running"
+                job.progress = max(0.0, min(1.0, fraction))
+                job.message = message or job.message
+
+    def _listen(self):
+        while True:
+            try:
+                self._update(*self._progress.get())
+            except (EOFError, OSError):
+                return
+            except queue.Empty:
+                continue
+
+    def _finish(self, job_id, future):
+        try:
+            result, error = future.result(), ""
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        with self._lock:
+            job = self._jobs[job_id]
+            job.result, job.error = result, error
+            job.status = "failed" if error else "done"
+            if not error:
+                job.progress = 1.0
+            job.finished_at = time.time()
+
+    def _evict(self):
+        # Forget the oldest finished jobs beyond the cache size; unfinished ones are kept.
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - RESULT_CACHE_SIZE)]:
+            job = self._jobs.pop(job_id)
+            if job.key is not None and self._by_key.get(job.key) == job_id:
+                del self._by_key[job.key]
+
+
+@st.cache_resource(show_spinner=False)
+def get_jobs():
+    return JobManager()
+
+
+# Only registered while the job is unfinished. Once it finishes we rerun the
+# page a single time: that run draws the result through `wait` without this
+# fragment, so its timer stops instead of redrawing the result every second.
+@st.fragment(run_every=POLL_EVERY)
+def _poll(job_id):
+    job = get_jobs().get(job_id)
+    if job is None or job.done:
+        st.rerun(scope="app")
+    st.progress(job.progress, text=job.message or ("Queued..." if job.status == "queued" else "Working..."))
+
+
+def wait(job_id, render):
+    """Call `render(job)` once the job has finished, showing a progress bar until then.
+
+    A job that is already finished is drawn straight away; otherwise a small
+    polling fragment shows its progress and reruns the page once when it ends.
+    """
+    job = get_jobs().get(job_id)
+    if job is None:
+        return
+    if job.done:
+        render(job)
+    else:
+        _poll(job_id)
@@ -0,0 +1,74 @@
+"""Low-bandwidth "lite mode" for slow connections and shared devices.
+
+Turned on with the toggle next to the language switcher on the home page and
+kept in `st.session_state.lite_mode`. In lite mode pages skip images, custom
+CSS and maps, and render lists from precomputed Markdown lines instead.
+
+Each page run gets one byte budget (WATERWATCH_LITE_BUDGET, default 24 KB),
+shared by every list on the page. Lists are measured line by line as UTF-8
+and cut off once the page's budget is spent, with a note saying how many
+entries were left out.
+"""
+import os
+
+import streamlit as st
+
+PAGE_BUDGET_BYTES = int(os.environ.get("WATERWATCH_LITE_BUDGET", "24000"))
+
+
+def enabled():
+    return bool(st.session_state.get("lite_mode", False))
+
+
+def _size(text):
+    return len(text.encode("utf-8"))
+
+
+def fit(lines, budget):
+    """The longest prefix of `lines` whose joined size fits in `budget` bytes, and its size."""
+    used, count = 0, 0
+    for line in lines:
+        cost = _size(line) + 1  # newline separator
+        if used + cost > budget:
+            break
+        used += cost
+        count += 1
+    return lines[:count], used
+
+
+class Budget:
+    """Bytes left for one page run; everything drawn through it is measured.
+
+    Create one per page run and pass it to every section that draws a list.
+    Each list is charged under its `key`, so a fragment that reruns with the
+    same budget replaces its earlier charge instead of adding to it.
+    """
+
+    def __init__(self, limit=PAGE_BUDGET_BYTES):
+        self.limit = limit
+        self._spent = {}
+
+    @property
+    def used(self):
+        return sum(self._spent.values())
+
+    @property
+    def remaining(self):
+        return max(0, self.limit - self.used)
+
+    def lines(self, lines, omitted_message, total=None, key=None):
+        """Draw as many of `lines` as fit, then `omitted_message.format(count=...)` for the rest.
+
+        `total` is the full number of entries when `lines` only covers the first few.
+        `key` names the section being drawn; it defaults to the omitted message.
+        """
+        key = omitted_message if key is None else key
+        self._spent.pop(key, None)
+        shown, size = fit(lines, self.remaining)
+        self._spent[key] = size
+        if shown:
+            st.markdown("\n".join(shown))
+        omitted = (len(lines) if total is None else total) - len(shown)
+        if omitted > 0:
+            st.caption(omitted_message.format(count=omitted))
+        return len(shown)
@@ -0,0 +1,80 @@
+"""OpenAI chat completions routed through the shared gateway, with usage accounting."""
+import hashlib
+import json
+import re
+import textwrap
+import time
+
+from openai import OpenAI
+
+from waterwatch.gateway import gateway
+from waterwatch.usage import ledger
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
+
+def compact_text(text):
+    """Dedent and squeeze whitespace out of a prompt without changing its wording."""
+    lines = [" ".join(line.split()) for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def compact_messages(messages):
+    return [{**message, "content": compact_text(message["content"])} for message in messages]
+
+
+def request_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chat(messages, feature, language=None, model=DEFAULT_MODEL, **params):
+    """Return the stripped text of a chat completion.
+
+    Prompts are compacted, the feature's token budget is checked, and the
+    call's tokens, latency and cache status are recorded under `feature` and
+    `language`. Concurrent identical requests share a single upstream call.
+    """
+    ledger.check(feature)
+    messages = compact_messages(messages)
+    key = request_key(model, messages, params)
+    upstream = []
+
+    def create():
+        upstream.append(True)
+        return get_client().chat.completions.create(model=model, messages=messages, timeout=timeout, **params)
+
+    timeout = gateway.timeout("openai")
+    started = time.monotonic()
+    response = gateway.call("openai", key, create, timeout=timeout)
+    latency = time.monotonic() - started
+
+    if upstream:
+        usage = response.usage
+        ledger.record(feature, language, model, usage.prompt_tokens, usage.completion_tokens, latency, cache="miss")
+    else:
+        # Another session made this call; we only waited for it.
+        ledger.record(feature, language, model, latency_s=latency, cache="coalesced")
+    return response.choices[0].message.content.strip()
+
+
+def chat_json(messages, feature, language=None, model=DEFAULT_MODEL, **params):
+    """Like `chat`, but asks for a JSON object and returns it parsed.
+
+    The prompt itself must mention JSON and describe the keys wanted.
+    Raises ValueError if the reply isn't valid JSON.
+    """
+    text = chat(messages, feature, language, model, response_format={"type": "json_object"}, **params)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"model did not return valid JSON: {e}") from e
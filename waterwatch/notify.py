@@ -0,0 +1,304 @@
+"""SMS fan-out for bulletin alerts.
+
+Publishing an alert only records a fan-out job in a local SQLite database and
+returns. A background dispatcher (one per process) expands the job into one
+outbox row per matching subscriber with a single INSERT ... SELECT, then
+drains the outbox in batches through a pluggable gateway with bounded
+concurrency and exponential backoff. Because the outbox is on disk, queued
+messages survive restarts.
+
+The gateway is chosen with WATERWATCH_SMS_GATEWAY="package.module:factory";
+by default messages go to LocalGateway, which just appends them to a file.
+"""
+import importlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import streamlit as st
+
+from waterwatch.paths import data_path
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = data_path("notify.sqlite3")
+GATEWAY_ENV = "WATERWATCH_SMS_GATEWAY"
+
+BATCH_SIZE = 100        # messages handed to the gateway per call
+CONCURRENCY = 4         # gateway calls in flight at once
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 2.0   # first retry delay, doubled per attempt
+IDLE_SECONDS = 1.0
+STUCK_SECONDS = 300     # "sending" rows older than this are requeued
+REQUEUE_EVERY = 60      # how often the worker looks for stuck rows
+ANY = "*"
+
+ZIP_RE = re.compile(r"\b(\d{5})(?:-\d{4})?\b")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    language TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (address, resource_type, zipcode)
+);
+CREATE INDEX IF NOT EXISTS subscribers_match ON subscribers (resource_type, zipcode);
+CREATE TABLE IF NOT EXISTS fanout_jobs (
+    id INTEGER PRIMARY KEY,
+    resource_type TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    bodies TEXT NOT NULL,
+    expanded INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (job_id, address)
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+@dataclass(frozen=True)
+class OutboundMessage:
+    id: int
+    address: str
+    body: str
+
+
+class LocalGateway:
+    """Stand-in gateway that appends messages to a file instead of sending them.
+
+    `latency` (seconds per batch) and `failure_rate` make it useful for
+    exercising batching and retries locally.
+    """
+
+    def __init__(self, path=None, latency=0.0, failure_rate=0.0):
+        self.path = path or data_path("sms_outbox.log")
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        """Send messages; return one error string (or None on success) per message."""
+        if self.latency:
+            time.sleep(self.latency)
+        results = [("simulated failure" if random.random() < self.failure_rate else None) for _ in messages]
+        with self._lock, open(self.path, "a", encoding="utf-8") as log:
+            for message, error in zip(messages, results):
+                if error is None:
+                    log.write(json.dumps({"to": message.address, "body": message.body}, ensure_ascii=False) + "\n")
+        return results
+
+
+def load_gateway():
+    spec = os.environ.get(GATEWAY_ENV)
+    if not spec:
+        return LocalGateway()
+    module_name, _, factory = spec.partition(":")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@contextmanager
+def _transaction(conn):
+    """BEGIN IMMEDIATE ... COMMIT that rolls back if anything fails, so a
+    long-lived connection is never left inside an open transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+def _requeue_stuck(conn):
+    """Put rows claimed by a worker that never settled them back in the queue."""
+    conn.execute(
+        "UPDATE outbox SET status = 'queued' WHERE status = 'sending' AND updated_at < ?",
+        (time.time() - STUCK_SECONDS,),
+    )
+
+
+def alert_zipcode(address):
+    match = ZIP_RE.search(address or "")
+    return match.group(1) if match else ANY
+
+
+class Dispatcher:
+    def __init__(self, gateway=None):
+        self.gateway = gateway or load_gateway()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._sent_times = deque(maxlen=100_000)
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "batches": 0}
+        with closing(_connect()) as conn:
+            conn.executescript(SCHEMA)
+            _requeue_stuck(conn)
+        self._thread = threading.Thread(target=self._run, name="waterwatch-sms", daemon=True)
+        self._thread.start()
+
+    # — API used by the pages —
+
+    def subscribe(self, address, resource_types, zipcode=None, language="English"):
+        if isinstance(resource_types, str):
+            resource_types = [resource_types]
+        rows = [(address, kind, zipcode or ANY, language, time.time()) for kind in (resource_types or [ANY])]
+        with closing(_connect()) as conn:
+            conn.executemany(
+                "INSERT INTO subscribers (address, resource_type, zipcode, language, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (address, resource_type, zipcode) DO UPDATE SET language = excluded.language",
+                rows,
+            )
+
+    def publish(self, resource_type, address, bodies):
+        """Queue an alert for every matching subscriber. Returns immediately.
+
+        `bodies` maps language -> message text; subscribers get their own
+        language, falling back to English.
+        """
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT INTO fanout_jobs (resource_type, zipcode, bodies, created_at) VALUES (?, ?, ?, ?)",
+                (resource_type, alert_zipcode(address), json.dumps(bodies, ensure_ascii=False), time.time()),
+            )
+        self._wake.set()
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            counters = dict(self.counters)
+            recent = sum(1 for sent_at in self._sent_times if now - sent_at <= 60)
+        with closing(_connect()) as conn:
+            counters["queued"] = conn.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('queued', 'sending')").fetchone()[0]
+            counters["subscribers"] = conn.execute("SELECT COUNT(DISTINCT address) FROM subscribers").fetchone()[0]
+        counters["sent_per_second"] = round(recent / 60, 2)
+        return counters
+
+    # — background worker —
+
+    def _run(self):
+        conn = _connect()
+        with ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="waterwatch-sms-send") as pool:
+            busy = False
+            requeued_at = time.monotonic()
+            while True:
+                try:
+                    if time.monotonic() - requeued_at >= REQUEUE_EVERY:
+                        _requeue_stuck(conn)
+                        requeued_at = time.monotonic()
+                    self._expand_jobs(conn)
+                    batches = self._claim(conn)
+                    if not batches:
+                        if busy:
+                            logger.info("SMS outbox drained: %s", self.metrics())
+                            busy = False
+                        self._wake.wait(IDLE_SECONDS)
+                        self._wake.clear()
+                        continue
+                    busy = True
+                    for batch, results in zip(batches, pool.map(self._send, batches)):
+                        self._settle(conn, batch, results)
+                except Exception:
+                    logger.exception("SMS dispatcher iteration failed")
+                    time.sleep(IDLE_SECONDS)
+
+    def _expand_jobs(self, conn):
+        now = time.time()
+        for job_id, resource_type, zipcode, bodies in conn.execute(
+            "SELECT id, resource_type, zipcode, bodies FROM fanout_jobs WHERE expanded = 0"
+        ).fetchall():
+            bodies = json.loads(bodies)
+            default = bodies.get("English") or next(iter(bodies.values()))
+            with _transaction(conn):
+                conn.execute(
+                    "INSERT OR IGNORE INTO outbox (job_id, address, body, next_attempt_at, updated_at) "
+                    "SELECT ?, address, COALESCE(json_extract(?, '$.\"' || MIN(language) || '\"'), ?), ?, ? "
+                    "FROM subscribers WHERE resource_type IN (?, ?) AND zipcode IN (?, ?) GROUP BY address",
+                    (job_id, json.dumps(bodies, ensure_ascii=False), default, now, now, resource_type, ANY, zipcode, ANY),
+                )
+                conn.execute("UPDATE fanout_jobs SET expanded = 1 WHERE id = ?", (job_id,))
+
+    def _claim(self, conn):
+        now = time.time()
+        with _transaction(conn):
+            rows = conn.execute(
+                "SELECT id, address, body FROM outbox WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, BATCH_SIZE * CONCURRENCY),
+            ).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending', updated_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+        messages = [OutboundMessage(*row) for row in rows]
+        return [messages[i:i + BATCH_SIZE] for i in range(0, len(messages), BATCH_SIZE)]
+
+    def _send(self, batch):
+        try:
+            return self.gateway.send_batch(batch)
+        except Exception as e:
+            return [str(e)] * len(batch)
+
+    def _settle(self, conn, batch, results):
+        now = time.time()
+        sent, retry, failed = [], [], []
+        for message, error in zip(batch, results):
+            if error is None:
+                sent.append((now, message.id))
+            else:
+                retry.append((error, now, message.id))
+        with _transaction(conn):
+            conn.executemany("UPDATE outbox SET status = 'sent', attempts = attempts + 1, updated_at = ? WHERE id = ?", sent)
+            for error, _, message_id in retry:
+                attempts = conn.execute("SELECT attempts + 1 FROM outbox WHERE id = ?", (message_id,)).fetchone()[0]
+                if attempts >= MAX_ATTEMPTS:
+                    failed.append(message_id)
+                    conn.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                        (attempts, error, now, message_id),
+                    )
+                else:
+                    delay = BACKOFF_SECONDS * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+                    conn.execute(
+                        "UPDATE outbox SET status = 'queued', attempts = ?, last_error = ?, next_attempt_at = ?, updated_at = ? "
+                        "WHERE id = ?",
+                        (attempts, error, now + delay, now, message_id),
+                    )
+        with self._lock:
+            self.counters["batches"] += 1
+            self.counters["sent"] += len(sent)
+            self.counters["failed"] += len(failed)
+            self.counters["retried"] += len(retry) - len(failed)
+            self._sent_times.extend([now] * len(sent))
+
+
+@st.cache_resource(show_spinner=False)
+def get_dispatcher():
+    """The process-wide dispatcher; starts its worker thread on first use."""
+    return Dispatcher()
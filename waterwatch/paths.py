@@ -0,0 +1,13 @@
+"""Local storage locations. Everything lives under WATERWATCH_DATA_DIR (default: ./data)."""
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(os.environ.get("WATERWATCH_DATA_DIR", ROOT / "data"))
+
+
+def data_path(*parts):
+    """Path under the data directory, creating its parent directories."""
+    path = DATA_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
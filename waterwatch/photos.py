@@ -0,0 +1,66 @@
+"""Content-addressed photo storage for water reports.
+
+Uploads are re-encoded (which drops EXIF, including GPS location), capped in
+size and stored under data/photos/<aa>/<sha256>.jpg, with a fixed-size WebP
+thumbnail generated at upload time next to it. Reports only store the hash.
+"""
+import hashlib
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from waterwatch.paths import DATA_DIR
+
+PHOTO_TYPES = ["jpg", "jpeg", "png", "webp"]
+MAX_SIDE = 2048
+THUMBNAIL_SIZE = (320, 240)
+
+
+class InvalidPhoto(ValueError):
+    pass
+
+
+def _paths(digest):
+    # Plain path arithmetic: lookups run for every report rendered, so only
+    # `store_photo` creates directories.
+    full = DATA_DIR / "photos" / digest[:2] / f"{digest}.jpg"
+    return full, full.with_name(f"{digest}.thumb.webp")
+
+
+def store_photo(raw):
+    """Sanitize, store and thumbnail an uploaded image. Returns its content hash."""
+    try:
+        with Image.open(BytesIO(raw)) as source:
+            # Apply the EXIF orientation, then save without any metadata.
+            image = ImageOps.exif_transpose(source).convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidPhoto(str(e)) from e
+    image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+
+    full, thumbnail = _paths(digest)
+    full.parent.mkdir(parents=True, exist_ok=True)
+    if not full.exists():
+        full.write_bytes(data)
+    if not thumbnail.exists():
+        thumb = ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS)
+        buffer = BytesIO()
+        thumb.save(buffer, format="WEBP", quality=70, method=6)
+        thumbnail.write_bytes(buffer.getvalue())
+    return digest
+
+
+def has_photo(digest):
+    return isinstance(digest, str) and len(digest) == 64 and _paths(digest)[0].exists()
+
+
+def photo_path(digest):
+    return str(_paths(digest)[0])
+
+
+def thumbnail_path(digest):
+    return str(_paths(digest)[1])
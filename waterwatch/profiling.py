@@ -0,0 +1,138 @@
+"""Opt-in sampling profiler for a single rerun of a page script.
+
+Call `maybe_profile(__file__)` at the top of a page. It does nothing unless
+profiling was asked for, either for every rerun with WATERWATCH_PROFILE=1, or
+for one rerun by opening the page with `?profile=<WATERWATCH_PROFILE_TOKEN>`.
+A background thread then samples the script thread's stack until the rerun
+finishes and writes a speedscope file (open it at https://www.speedscope.app)
+plus a top-N text summary to data/profiles/<page>/, keeping the newest few
+per page.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import streamlit as st
+
+from waterwatch.paths import data_path
+
+PROFILE_ENV = "WATERWATCH_PROFILE"
+TOKEN_ENV = "WATERWATCH_PROFILE_TOKEN"
+QUERY_PARAM = "profile"
+KEEP = int(os.environ.get("WATERWATCH_PROFILE_KEEP", "10"))
+INTERVAL = 0.005
+MAX_SECONDS = 120
+TOP_N = 25
+
+
+def _requested():
+    if os.environ.get(PROFILE_ENV) == "1":
+        return True
+    token = os.environ.get(TOKEN_ENV)
+    if not token or st.query_params.get(QUERY_PARAM) != token:
+        return False
+    # Profile just this rerun, not every rerun while the parameter is in the URL.
+    del st.query_params[QUERY_PARAM]
+    return True
+
+
+def maybe_profile(script_path):
+    if _requested():
+        _Sampler(threading.get_ident(), script_path).start()
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, target_ident, script_path):
+        super().__init__(name="waterwatch-profiler", daemon=True)
+        self.target_ident = target_ident
+        self.script_path = os.path.abspath(script_path)
+        self.page = re.sub(r"[^\w-]+", "_", Path(script_path).stem)
+        self.samples = []  # (stack as tuple of frame keys, weight in seconds)
+
+    def _stack(self, frame):
+        stack = []
+        in_script = False
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            in_script = in_script or os.path.abspath(code.co_filename) == self.script_path
+            frame = frame.f_back
+        return tuple(reversed(stack)), in_script
+
+    def run(self):
+        started = last = time.perf_counter()
+        while time.perf_counter() - started < MAX_SECONDS:
+            time.sleep(INTERVAL)
+            frame = sys._current_frames().get(self.target_ident)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack, in_script = self._stack(frame)
+            del frame
+            if not in_script:
+                break  # the rerun has finished
+            self.samples.append((stack, now - last))
+            last = now
+        if self.samples:
+            self._write(time.perf_counter() - started)
+
+    def _write(self, duration):
+        frames, index = [], {}
+        sampled = []
+        for stack, _ in self.samples:
+            ids = []
+            for key in stack:
+                if key not in index:
+                    index[key] = len(frames)
+                    name, filename, line = key
+                    frames.append({"name": name, "file": filename, "line": line})
+                ids.append(index[key])
+            sampled.append(ids)
+        weights = [weight for _, weight in self.samples]
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        speedscope = data_path("profiles", self.page, f"{stamp}.speedscope.json")
+        speedscope.write_text(json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.page} {stamp}",
+            "exporter": "waterwatch.profiling",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.page,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": sampled,
+                "weights": weights,
+            }],
+        }))
+        data_path("profiles", self.page, f"{stamp}.top.txt").write_text(self._summary(duration))
+        self._prune(speedscope.parent)
+
+    def _summary(self, duration):
+        own, total = Counter(), Counter()
+        for stack, weight in self.samples:
+            own[stack[-1]] += weight
+            for key in set(stack):
+                total[key] += weight
+        lines = [f"{self.page}: {duration:.3f}s wall, {len(self.samples)} samples every {INTERVAL * 1000:.0f}ms", ""]
+        for title, counter in (("Self time", own), ("Total time", total)):
+            lines.append(f"{title}:")
+            for (name, filename, line), seconds in counter.most_common(TOP_N):
+                lines.append(f"  {seconds:8.3f}s  {name}  ({filename}:{line})")
+            lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _prune(directory):
+        runs = sorted({path.name.split(".")[0] for path in directory.iterdir()})
+        for stale in runs[:-KEEP]:
+            for path in directory.glob(f"{stale}.*"):
+                path.unlink()
@@ -0,0 +1,198 @@
+"""Registry linking water reports to the drinking-water sources on the map.
+
+Each report with coordinates is assigned to the nearest known source within
+MAX_DISTANCE_M, using a blocked numpy haversine join (reports x sources).
+Every source keeps a decaying "problem weight": each report adds its
+severity (see `heatmap.report_severity`), and the weight halves every
+HALF_LIFE_DAYS. Health is 100 for a source with no recent problems, falling
+towards 0 as the weight grows.
+
+State lives in data/registry.sqlite3. A report is keyed by a hash of all its
+fields, and the registry stores how many reports with each key it has
+applied, so a sync applies exactly the reports it hasn't seen: including
+late edits and imports dated before newer reports, and each of several
+otherwise identical reports. Only located reports count as applied, so a
+report that gains coordinates later is picked up then.
+"""
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from waterwatch.heatmap import report_severity
+from waterwatch.paths import data_path
+from waterwatch.reports import REPORT_COLUMNS
+
+DB_PATH = data_path("registry.sqlite3")
+
+MAX_DISTANCE_M = 250
+HALF_LIFE_DAYS = 14.0
+HEALTH_SCALE = 4.0  # problem weight at which health drops to about 37
+BLOCK_SIZE = 512    # reports per block of the distance matrix
+EARTH_RADIUS_M = 6_371_000.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_health (
+    source_id TEXT PRIMARY KEY,
+    weight REAL NOT NULL,
+    updated_day REAL NOT NULL,
+    reports INTEGER NOT NULL,
+    last_report_at TEXT NOT NULL,
+    last_concerns TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS registry_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS applied_reports (
+    report_key TEXT PRIMARY KEY,
+    applied INTEGER NOT NULL
+);
+"""
+
+HEALTH_COLUMNS = ["source_id", "health", "reports", "last_report_at", "last_concerns"]
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _day(timestamps):
+    """Days since the epoch (local, naive) for a Series of timestamps."""
+    return (timestamps - pd.Timestamp(0)) / pd.Timedelta(days=1)
+
+
+def _decay(days):
+    return 0.5 ** (np.maximum(days, 0) / HALF_LIFE_DAYS)
+
+
+def nearest_sources(lat, lon, source_lat, source_lon, block_size=BLOCK_SIZE):
+    """Index of, and distance in metres to, the nearest source for every report."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    source_lat, source_lon = np.radians(source_lat), np.radians(source_lon)
+    cos_source = np.cos(source_lat)
+    nearest = np.empty(len(lat), dtype=np.int64)
+    distance = np.empty(len(lat))
+    for start in range(0, len(lat), block_size):
+        block = slice(start, start + block_size)
+        a = (np.sin((source_lat[None, :] - lat[block, None]) / 2) ** 2
+             + np.cos(lat[block, None]) * cos_source[None, :] * np.sin((source_lon[None, :] - lon[block, None]) / 2) ** 2)
+        # Haversine is monotonic in `a`, so only the winners need the arcsine.
+        nearest[block] = a.argmin(axis=1)
+        best = a[np.arange(len(nearest[block])), nearest[block]]
+        distance[block] = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(best, 0, 1)))
+    return nearest, distance
+
+
+def _report_keys(reports):
+    """A hash of each report's fields, as strings."""
+    fields = reports.reindex(columns=REPORT_COLUMNS).fillna("").astype(str)
+    return pd.util.hash_pandas_object(fields, index=False).astype(str)
+
+
+class SourceRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced = None
+        with closing(_connect()) as conn:
+            conn.executescript(SCHEMA)
+            # Registries synced by timestamp watermark can't tell which reports they
+            # applied; start them over so the next sync rebuilds from the sheet.
+            if conn.execute("SELECT 1 FROM registry_state WHERE key = 'watermark'").fetchone():
+                conn.executescript("BEGIN IMMEDIATE; DELETE FROM source_health; DELETE FROM registry_state; COMMIT;")
+
+    def sync(self, reports, version, sources):
+        """Apply reports not seen before to the sources (lat, lon, id) near them."""
+        with self._lock:
+            key = (version, len(sources))
+            if key == self._synced:
+                return
+            self._synced = key
+            if reports.empty or sources.empty or not {"lat", "lon"} <= set(reports.columns):
+                return
+            with closing(_connect()) as conn:
+                self._apply(conn, reports, sources)
+
+    def _apply(self, conn, reports, sources):
+        lat = pd.to_numeric(reports["lat"], errors="coerce").to_numpy()
+        lon = pd.to_numeric(reports["lon"], errors="coerce").to_numpy()
+        times = pd.to_datetime(reports["timestamp"], errors="coerce")
+        located = ~(np.isnan(lat) | np.isnan(lon) | times.isna().to_numpy())
+
+        keys = _report_keys(reports[located])
+        applied = dict(conn.execute("SELECT report_key, applied FROM applied_reports").fetchall())
+        # With n reports of a key already applied, every occurrence after the n-th is new
+        new = (keys.groupby(keys).cumcount() >= keys.map(applied).fillna(0)).to_numpy()
+        if not new.any():
+            return
+        fresh, keys = reports[located][new], keys[new]
+        lat, lon, times = lat[located][new], lon[located][new], times[located][new]
+
+        nearest, distance = nearest_sources(
+            lat, lon, sources["lat"].to_numpy(dtype=float), sources["lon"].to_numpy(dtype=float),
+        )
+        close = distance <= MAX_DISTANCE_M
+        matched = fresh[close]
+        today = _day(pd.Timestamp.now())
+        joined = pd.DataFrame({
+            "source_id": sources["id"].astype(str).to_numpy()[nearest[close]],
+            "weight": report_severity(matched) * _decay(today - _day(times[close]).to_numpy()),
+            "timestamp": matched["timestamp"].to_numpy(),
+            "concerns": matched["concerns"].fillna("").astype(str).to_numpy(),
+        }).sort_values("timestamp")
+        grouped = joined.groupby("source_id").agg(
+            weight=("weight", "sum"), reports=("weight", "size"),
+            last_report_at=("timestamp", "last"), last_concerns=("concerns", "last"),
+        )
+        # Decay each source's stored weight up to today before adding the new reports
+        placeholders = ", ".join("?" * len(grouped))
+        stored = pd.DataFrame(conn.execute(
+            f"SELECT source_id, weight, updated_day, reports, last_report_at, last_concerns "
+            f"FROM source_health WHERE source_id IN ({placeholders})", list(grouped.index),
+        ).fetchall(), columns=["source_id", "weight", "updated_day", "reports", "last_report_at", "last_concerns"]).set_index("source_id")
+        stored = stored.reindex(grouped.index)
+        previous = stored["weight"].fillna(0) * _decay(today - stored["updated_day"].fillna(today))
+        newer = stored["last_report_at"].isna() | (grouped["last_report_at"] >= stored["last_report_at"].fillna(""))
+        updates = list(zip(
+            grouped.index,
+            (previous + grouped["weight"]).tolist(),
+            [today] * len(grouped),
+            (stored["reports"].fillna(0) + grouped["reports"]).astype(int).tolist(),
+            grouped["last_report_at"].where(newer, stored["last_report_at"]).tolist(),
+            grouped["last_concerns"].where(newer, stored["last_concerns"]).tolist(),
+        ))
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO source_health VALUES (?, ?, ?, ?, ?, ?)", updates)
+            conn.executemany(
+                "INSERT INTO applied_reports (report_key, applied) VALUES (?, ?) "
+                "ON CONFLICT (report_key) DO UPDATE SET applied = applied + excluded.applied",
+                [(key, int(count)) for key, count in keys.value_counts().items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def health(self, source_ids):
+        """Current health (0-100) of each source, decayed to today, with its report history."""
+        with closing(_connect()) as conn:
+            rows = conn.execute(
+                "SELECT source_id, weight, updated_day, reports, last_report_at, last_concerns FROM source_health"
+            ).fetchall()
+        table = pd.DataFrame(rows, columns=["source_id", "weight", "updated_day", "reports", "last_report_at", "last_concerns"])
+        table = table[table["source_id"].isin(pd.Series(source_ids).astype(str))]
+        weight = table["weight"] * _decay(_day(pd.Timestamp.now()) - table["updated_day"])
+        table["health"] = (100 * np.exp(-weight / HEALTH_SCALE)).round().astype(int)
+        return table[HEALTH_COLUMNS]
+
+
+@st.cache_resource(show_spinner=False)
+def get_registry():
+    return SourceRegistry()
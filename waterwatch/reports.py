@@ -0,0 +1,17 @@
+"""Water report schema shared by the report form and bulk import."""
+import re
+
+REPORT_COLUMNS = ["timestamp", "address", "zipcode", "description", "concerns", "type", "used", "symptoms"]
+REQUIRED_FIELDS = ["address", "zipcode", "description", "concerns", "type", "used"]
+
+CONCERN_OPTIONS = ["Discoloration", "Foul smell", "Foam on surface", "Bugs or larvae", "Near industrial area", "Trash nearby", "Other"]
+SOURCE_TYPES = ["Faucet", "River/Stream", "Pipe Leak", "Fountain", "Rainwater Pool", "Other"]
+USED_OPTIONS = ["Yes", "No"]
+
+# 5-digit or 9-digit (5 + hyphen + 4 digits) ZIP codes
+ZIP_PATTERN = r"\d{5}(-\d{4})?"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def validate_zipcode(zipcode):
+    return re.fullmatch(ZIP_PATTERN, zipcode) is not None
@@ -0,0 +1,131 @@
+"""Incremental inverted index with BM25 ranking.
+
+Text is accent-folded before tokenizing so "agua sucia" matches "Agua súcia"
+and Spanish reports are searchable from an English keyboard.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+import pandas as pd
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are at be by de del el en es for from in is it la las los of on or "
+    "para por que the this to un una was with y".split()
+)
+
+
+def fold(text):
+    """Lower-case and strip accents."""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, analyzer=tokenize):
+        self.analyzer = analyzer
+        self._postings = {}   # term -> {doc_id: term frequency}
+        self._doc_terms = {}  # doc_id -> Counter of terms, needed to remove a doc
+        self._doc_lengths = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, doc_id, text):
+        if doc_id in self._doc_terms:
+            self.remove(doc_id)
+        terms = Counter(self.analyzer(text))
+        self._doc_terms[doc_id] = terms
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def idf(self, term):
+        postings = self._postings.get(term, ())
+        doc_count = len(self._doc_terms)
+        return math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def terms(self, doc_id):
+        return self._doc_terms.get(doc_id, Counter())
+
+    def search(self, query, limit=50):
+        """Return up to `limit` `(doc_id, score)` pairs, best first."""
+        doc_count = len(self._doc_terms)
+        if not doc_count:
+            return []
+        avg_length = self._total_length / doc_count or 1.0
+        lengths = self._doc_lengths
+        scores = Counter()
+        for term in set(self.analyzer(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+class DataFrameIndex:
+    """Keeps a SearchIndex in step with a DataFrame, re-tokenizing only changed rows.
+
+    Documents are keyed by the frame's index labels. Rows are fingerprinted in
+    one vectorized pass, so a sync after one new report only tokenizes that
+    report.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.index = SearchIndex()
+        self._hashes = pd.Series(dtype="uint64")
+        self._version = None
+        self._lock = threading.Lock()
+
+    def sync(self, data, version=None):
+        with self._lock:
+            if version is not None and version == self._version:
+                return
+            text = pd.Series("", index=data.index)
+            for field in self.fields:
+                if field in data.columns:
+                    text = text + " " + data[field].fillna("").astype(str)
+            hashes = pd.util.hash_pandas_object(text, index=False)
+
+            for doc_id in self._hashes.index.difference(hashes.index):
+                self.index.remove(doc_id)
+            previous = self._hashes.reindex(hashes.index)
+            changed = hashes.index[previous.isna() | (previous != hashes)]
+            for doc_id in changed:
+                self.index.add(doc_id, text[doc_id])
+
+            self._hashes = hashes
+            self._version = version
+
+    def search(self, query, limit=50):
+        with self._lock:
+            return self.index.search(query, limit)
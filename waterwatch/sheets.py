@@ -0,0 +1,213 @@
+"""Process-wide replica of a Google Sheets worksheet, kept fresh with delta reads.
+
+Instead of re-downloading the whole worksheet every few seconds, each poll
+asks the Sheets API for the range starting at the last row we know about
+(that row is re-read to check nothing above it moved), so only new rows
+cross the network. A periodic full read catches edits and deletions. Every
+change produces a new versioned `Snapshot`.
+
+Ranged reads need a service-account connection; a public-URL connection can
+only export the whole sheet as CSV, so it falls back to a full read per poll.
+
+Snapshots are shared by every session in the process and must not be
+modified in place; sessions take `Snapshot.view()`, which is a zero-copy
+shallow copy under pandas Copy-on-Write, so only the columns or rows a
+session actually changes or filters get copied.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+from gspread.utils import rowcol_to_a1
+from streamlit_gsheets import GSheetsConnection
+
+POLL_SECONDS = 5
+FULL_CHECK_SECONDS = 300
+
+# Copy-on-Write makes the shallow copies handed to sessions safe to modify
+# (it is always on from pandas 3.0).
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: int
+    data: pd.DataFrame
+    synced_at: float
+
+    def view(self):
+        """A session-private DataFrame sharing this snapshot's memory until written to."""
+        return self.data.copy(deep=False)
+
+
+def iter_records(data):
+    """Yield rows as dicts one at a time instead of building `to_dict("records")`."""
+    columns = list(data.columns)
+    for values in data.itertuples(index=False, name=None):
+        yield dict(zip(columns, values))
+
+
+def _fingerprint(data):
+    # A sum of row hashes, so appending rows only needs the new rows hashed.
+    return int(pd.util.hash_pandas_object(data, index=False).sum()) if not data.empty else 0
+
+
+def _normalise(data):
+    """Every value as text (missing values stay NaN), the way a read returns it."""
+    data = data.astype(str).mask(data.isna())
+    # Normalise once here rather than in every session.
+    if "zipcode" in data.columns:
+        data["zipcode"] = data["zipcode"].str.strip()
+    return data
+
+
+class SheetReplica:
+    def __init__(self, conn, worksheet, poll_seconds=POLL_SECONDS, full_check_seconds=FULL_CHECK_SECONDS):
+        self.conn = conn
+        self.worksheet = worksheet
+        self.poll_seconds = poll_seconds
+        self.full_check_seconds = full_check_seconds
+        self._snapshot = None
+        self._fingerprint = None
+        self._sheet_rows = 0  # data rows in the sheet up to the last non-empty one
+        self._gspread = None
+        self._last_poll = 0.0
+        self._last_full = 0.0
+        self._sync_lock = threading.Lock()
+        self.stats = {"full_reads": 0, "delta_reads": 0, "rows_fetched": 0}
+
+    def read_all(self):
+        """Every non-empty row straight from the sheet, bypassing the snapshot.
+
+        Index labels are the rows' 0-based positions below the header (empty
+        rows are dropped but keep their position), as `delete_rows` expects.
+        """
+        # Everything is read as text so full and delta reads parse identically.
+        return _normalise(self.conn.read(worksheet=self.worksheet, ttl=0, dtype=str).dropna(how="all"))
+
+    def _read(self):
+        data = self.read_all()
+        self._sheet_rows = int(data.index[-1]) + 1 if len(data) else 0
+        return data.reset_index(drop=True)
+
+    def _gspread_worksheet(self):
+        """The connection's underlying gspread worksheet, or None for public-URL connections."""
+        if self._gspread is None:
+            select = getattr(getattr(self.conn, "client", None), "_select_worksheet", None)
+            self._gspread = select(worksheet=self.worksheet) if select is not None else False
+        return self._gspread or None
+
+    def _read_tail(self, worksheet, first_row, columns):
+        """Sheet rows from `first_row` (1-based, header is row 1) on, and how many rows came back."""
+        last_column = rowcol_to_a1(1, len(columns))[:-1]
+        values = worksheet.get(
+            f"A{first_row}:{last_column}",
+            value_render_option="UNFORMATTED_VALUE",
+            date_time_render_option="FORMATTED_STRING",
+        )
+        # The API trims trailing empty cells, and empty rows come back as [].
+        rows = [[str(value) for value in row] + [""] * (len(columns) - len(row)) for row in values]
+        tail = pd.DataFrame(rows, columns=columns, dtype=object)
+        return _normalise(tail.mask(tail == "")), len(values)
+
+    def snapshot(self):
+        """Return the current snapshot, syncing first if the poll interval has passed.
+
+        Only one session syncs at a time; the others keep using the snapshot
+        they would have got anyway instead of queueing behind the read.
+        """
+        now = time.monotonic()
+        due = self._snapshot is None or now - self._last_poll >= self.poll_seconds
+        if due and self._sync_lock.acquire(blocking=self._snapshot is None):
+            try:
+                now = time.monotonic()
+                if self._snapshot is None or now - self._last_full >= self.full_check_seconds:
+                    self._full_sync(now)
+                elif now - self._last_poll >= self.poll_seconds:
+                    self._delta_sync(now)
+            finally:
+                self._sync_lock.release()
+        return self._snapshot
+
+    def replace(self, data):
+        """Record data we just wrote to the sheet ourselves (write-through)."""
+        with self._sync_lock:
+            data = _normalise(data.reset_index(drop=True))
+            self._sheet_rows = len(data)
+            self._publish(data, time.monotonic())
+
+    def delete_rows(self, positions):
+        """Delete the rows at `positions` (index labels from `read_all`) in one batch, then resync.
+
+        Only the given rows are removed, so rows other sessions append in the
+        meantime survive (rewriting the whole sheet would drop them). Needs a
+        service-account connection.
+        """
+        worksheet = self._gspread_worksheet()
+        if worksheet is None:
+            raise RuntimeError(f"Deleting rows from {self.worksheet!r} needs a service-account connection")
+        # Contiguous runs, bottom-up so each deletion leaves the rows above it in place.
+        runs = []
+        for position in sorted(set(positions), reverse=True):
+            if runs and runs[-1][0] == position + 1:
+                runs[-1][0] = position
+            else:
+                runs.append([position, position + 1])
+        if runs:
+            worksheet.spreadsheet.batch_update({"requests": [
+                # Sheet row indexes are 0-based with the header at 0.
+                {"deleteDimension": {"range": {
+                    "sheetId": worksheet.id, "dimension": "ROWS", "startIndex": start + 1, "endIndex": end + 1,
+                }}}
+                for start, end in runs
+            ]})
+        with self._sync_lock:
+            self._full_sync(time.monotonic())
+
+    def _full_sync(self, now):
+        data = self._read()
+        self.stats["full_reads"] += 1
+        self.stats["rows_fetched"] += len(data)
+        self._last_full = now
+        self._publish(data, now)
+
+    def _delta_sync(self, now):
+        known = self._snapshot.data
+        worksheet = self._gspread_worksheet()
+        if known.empty or worksheet is None:
+            return self._full_sync(now)
+        # Re-read the last known row (sheet row _sheet_rows + 1) along with anything after it.
+        tail, rows = self._read_tail(worksheet, self._sheet_rows + 1, list(known.columns))
+        self.stats["delta_reads"] += 1
+        self.stats["rows_fetched"] += rows
+        last_known = known.iloc[[-1]].reset_index(drop=True)
+        if tail.empty or not tail.iloc[[0]].equals(last_known):
+            # Rows were deleted or edited above the tail; resynchronise.
+            return self._full_sync(now)
+        added = tail.iloc[1:].dropna(how="all")
+        self._sheet_rows += rows - 1
+        if added.empty:
+            self._last_poll = now
+            return
+        fingerprint = (self._fingerprint + _fingerprint(added)) % 2 ** 64
+        self._publish(pd.concat([known, added], ignore_index=True), now, fingerprint)
+
+    def _publish(self, data, now, fingerprint=None):
+        self._last_poll = now
+        if fingerprint is None:
+            fingerprint = _fingerprint(data)
+        if self._snapshot is not None and fingerprint == self._fingerprint:
+            return
+        version = 1 if self._snapshot is None else self._snapshot.version + 1
+        self._fingerprint = fingerprint
+        self._snapshot = Snapshot(version=version, data=data, synced_at=time.time())
+
+
+@st.cache_resource(show_spinner=False)
+def get_replica(worksheet):
+    """The shared replica for `worksheet`, created once per process."""
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    return SheetReplica(conn, worksheet)
@@ -0,0 +1,181 @@
+"""Token-budgeted map-reduce summarization of raw report text.
+
+Reports are sorted oldest first, grouped by calendar month and packed
+greedily into chunks that fit a token budget within each month. Chunk
+boundaries therefore depend only on the reports in their own month: a new
+report changes the newest chunk, and the sliding start of a date range only
+changes the oldest month's chunks. Each chunk is summarized once (cached by
+its hash) and the partial summaries are reduced into the final answer, again
+grouped by year so the merges stay cacheable too.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from waterwatch import llm
+from waterwatch.usage import ledger
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character-based estimate
+    tiktoken = None
+
+CHUNK_TOKENS = 2500
+REDUCE_TOKENS = 3000
+PARTIAL_MAX_TOKENS = 250
+MAX_WORKERS = 4
+MAX_CHUNKS = 40
+CACHE_SIZE = 1024
+PROMPT_VERSION = "v1"
+FEATURE = "zip_analysis"
+
+MAP_PROMPT = (
+    "You summarize batches of community reports about water problems. "
+    "List the distinct issues (smell, color, taste, contamination, symptoms), "
+    "the streets or areas mentioned, and approximate dates when issues repeat. "
+    "Be brief and factual; use short bullet points."
+)
+MERGE_PROMPT = (
+    "Merge these partial summaries of water reports into one set of bullet points. "
+    "Keep distinct issues, places and dates; drop duplicates."
+)
+
+_partials = OrderedDict()
+_partials_lock = threading.Lock()
+
+if tiktoken is not None:
+    _encoding = tiktoken.get_encoding("cl100k_base")
+
+    def estimate_tokens(text):
+        return len(_encoding.encode(text))
+else:
+    def estimate_tokens(text):
+        return len(text) // 4 + 1
+
+
+def format_report(report):
+    """One line per report, without the date (see `report_lines`)."""
+    parts = [
+        str(report.get("address", "")),
+        str(report.get("concerns", "")),
+        f"used: {report.get('used', '')}",
+    ]
+    symptoms = report.get("symptoms")
+    if symptoms and not pd.isna(symptoms) and symptoms != "N/A":
+        parts.append(f"symptoms: {symptoms}")
+    parts.append(str(report.get("description", "")))
+    return " | ".join(" ".join(part.split()) for part in parts)
+
+
+def report_lines(reports):
+    """`(month, line)` pairs oldest first, folding runs of identical reports into one line.
+
+    Repeat submissions of the same report are common; sending them once with
+    all their dates keeps the prompt short without losing the repetition.
+    Runs never cross a month, so each month's lines depend only on its reports.
+    """
+    lines, previous, dates = [], None, []
+    for report in reports.sort_values("timestamp", kind="stable").to_dict(orient="records"):
+        body = format_report(report)
+        when = str(report.get("timestamp", ""))
+        if body == previous and when[:7] == dates[0][:7]:
+            dates.append(when)
+            continue
+        if previous is not None:
+            lines.append((dates[0][:7], f"{', '.join(dates)} | {previous}"))
+        previous, dates = body, [when]
+    if previous is not None:
+        lines.append((dates[0][:7], f"{', '.join(dates)} | {previous}"))
+    return lines
+
+
+def chunk_lines(keyed_lines, budget=CHUNK_TOKENS):
+    """Pack `(key, line)` pairs into `(key, chunk)` pairs of at most `budget` estimated tokens.
+
+    Packing is greedy but restarts at every new key, so a chunk never spans
+    two keys and changes to one key's lines can't shift another key's chunks.
+    """
+    chunks, current, used, current_key = [], [], 0, None
+    for key, line in keyed_lines:
+        cost = estimate_tokens(line) + 1
+        if current and (key != current_key or used + cost > budget):
+            chunks.append((current_key, "\n".join(current)))
+            current, used = [], 0
+        current.append(line)
+        current_key = key
+        used += cost
+    if current:
+        chunks.append((current_key, "\n".join(current)))
+    return chunks
+
+
+def _cached(prompt, text, max_tokens, language):
+    key = hashlib.sha256(f"{PROMPT_VERSION}\0{prompt}\0{text}".encode("utf-8")).hexdigest()
+    with _partials_lock:
+        summary = _partials.get(key)
+        if summary is not None:
+            _partials.move_to_end(key)
+    if summary is not None:
+        ledger.record(FEATURE, language, llm.DEFAULT_MODEL, cache="hit")
+        return summary
+    summary = llm.chat(
+        [{"role": "system", "content": prompt}, {"role": "user", "content": text}],
+        feature=FEATURE,
+        language=language,
+        max_tokens=max_tokens,
+        temperature=0.2,
+    )
+    with _partials_lock:
+        _partials[key] = summary
+        while len(_partials) > CACHE_SIZE:
+            _partials.popitem(last=False)
+    return summary
+
+
+def _summarize_all(prompt, chunks, language):
+    """Summarize `(key, text)` chunks, keeping each summary's key."""
+    keys = [key for key, _ in chunks]
+    if len(chunks) == 1:
+        return [(keys[0], _cached(prompt, chunks[0][1], PARTIAL_MAX_TOKENS, language))]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        summaries = pool.map(lambda chunk: _cached(prompt, chunk[1], PARTIAL_MAX_TOKENS, language), chunks)
+        return list(zip(keys, summaries))
+
+
+def summarize_reports(reports, system_prompt, label, language=None, max_tokens=300, progress=None):
+    """Summarize a DataFrame of reports into one structured answer.
+
+    `system_prompt` is used for the final reduce step; `label` names the group
+    (e.g. "ZIP 95112") in the final user message. `progress(fraction, message)`
+    is called between stages if given.
+    """
+    progress = progress or (lambda fraction, message: None)
+    lines = report_lines(reports)
+    if not lines:
+        return ""
+
+    # Drop whole chunks rather than reports so the kept chunks stay cacheable.
+    progress(0.1, "Reading reports...")
+    partials = _summarize_all(MAP_PROMPT, chunk_lines(lines)[-MAX_CHUNKS:], language)
+    # Merge level by level until everything fits in one reduce prompt: first
+    # within each year (months stay put), then across everything.
+    progress(0.7, "Combining summaries...")
+    by_year = True
+    while len(partials) > 1 and estimate_tokens("\n\n".join(text for _, text in partials)) > REDUCE_TOKENS:
+        grouped = [(key[:4] if by_year else "", text) for key, text in partials]
+        partials = _summarize_all(MERGE_PROMPT, chunk_lines(grouped, REDUCE_TOKENS // 2), language)
+        by_year = False
+
+    return llm.chat(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Summaries of the reports for {label}, oldest first:\n\n" + "\n\n".join(text for _, text in partials)},
+        ],
+        feature=FEATURE,
+        language=language,
+        max_tokens=max_tokens,
+        temperature=0.5,
+    )
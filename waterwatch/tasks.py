@@ -0,0 +1,58 @@
+"""CPU-heavy work run in the background worker processes (see `waterwatch.jobs`).
+
+Everything here is a module-level function of picklable arguments, so it can
+be sent to a spawned worker.
+"""
+import io
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from waterwatch import archive  # noqa: E402
+from waterwatch.jobs import report_progress  # noqa: E402
+
+
+def weekly_counts(reports):
+    """Reports per week: columns `week` (e.g. "2024-05-06/2024-05-12") and `report_count`."""
+    weeks = pd.to_datetime(reports["timestamp"], errors="coerce").dropna().dt.to_period("W").astype(str)
+    return weeks.value_counts().sort_index().rename_axis("week").reset_index(name="report_count")
+
+
+def trend_chart(reports, zipcode):
+    """PNG of weekly report counts for one ZIP code, or None if there is nothing to plot."""
+    report_progress(0.1, "Counting reports per week...")
+    weekly = weekly_counts(reports)
+    if weekly.empty:
+        return None
+
+    report_progress(0.5, "Drawing chart...")
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(weekly["week"], weekly["report_count"], marker="o", color="#5a7694", linestyle="-", linewidth=2)
+
+    # Show every Nth week
+    nth_week = 4
+    ax.set_xticks(weekly["week"][::nth_week])
+    ax.set_xticklabels(weekly["week"][::nth_week], rotation=45, ha="right", fontsize=10)
+
+    ax.set_xlabel("Week", fontsize=12)
+    ax.set_ylabel("Number of Reports", fontsize=12)
+    ax.set_title(f"Water Source Reports Over Time - {zipcode}", fontsize=14)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def export_reports(live, start=None, include_archive=False):
+    """CSV bytes of the live reports, plus archived ones since `start` if asked for."""
+    frames = [live]
+    if include_archive:
+        report_progress(0.1, "Reading archived reports...")
+        frames = [archive.read_archive(start=start), archive.live_only(live)]
+    report_progress(0.5, "Encoding CSV...")
+    return pd.concat(frames, ignore_index=True).to_csv(index=False).encode("utf-8")
@@ -0,0 +1,84 @@
+"""Per-feature accounting for OpenAI calls: tokens, latency, cache status and budgets."""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# USD per 1K tokens (prompt, completion).
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+# Daily token budget per feature, shared by the whole process.
+FEATURE_BUDGETS = {
+    "tip": 200_000,
+    "zip_analysis": 1_000_000,
+    "bulletin_alert": 200_000,
+}
+
+
+class BudgetExceeded(Exception):
+    """A feature has used up its token budget for the day."""
+
+
+class UsageLedger:
+    def __init__(self, budgets=None, max_records=10_000):
+        self.budgets = dict(FEATURE_BUDGETS if budgets is None else budgets)
+        self.max_records = max_records
+        self._records = []
+        self._spent = defaultdict(int)  # (day, feature) -> tokens
+        self._lock = threading.Lock()
+
+    def check(self, feature):
+        budget = self.budgets.get(feature)
+        if budget is None:
+            return
+        with self._lock:
+            spent = self._spent[(date.today(), feature)]
+        if spent >= budget:
+            raise BudgetExceeded(f"Daily token budget for {feature!r} used up ({spent}/{budget})")
+
+    def record(self, feature, language, model, prompt_tokens=0, completion_tokens=0, latency_s=0.0, cache="miss"):
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        record = {
+            "time": time.time(),
+            "feature": feature,
+            "language": language or "",
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_s": round(latency_s, 3),
+            "cache": cache,
+            "cost_usd": (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000,
+        }
+        with self._lock:
+            self._records.append(record)
+            del self._records[:-self.max_records]
+            self._spent[(date.today(), feature)] += prompt_tokens + completion_tokens
+        logger.info("openai usage %s", record)
+
+    def records(self):
+        with self._lock:
+            return pd.DataFrame(list(self._records))
+
+    def summary(self):
+        """Calls, tokens, cost and latency per (feature, language, cache status)."""
+        records = self.records()
+        if records.empty:
+            return records
+        return records.groupby(["feature", "language", "cache"]).agg(
+            calls=("feature", "size"),
+            prompt_tokens=("prompt_tokens", "sum"),
+            completion_tokens=("completion_tokens", "sum"),
+            cost_usd=("cost_usd", "sum"),
+            p50_latency_s=("latency_s", "median"),
+            p95_latency_s=("latency_s", lambda s: s.quantile(0.95)),
+        ).reset_index()
+
+
+ledger = UsageLedger()